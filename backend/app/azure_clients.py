@@ -1,166 +1,391 @@
-import os
-from typing import Optional
-import azure.cognitiveservices.speech as speechsdk
-from azure.ai.textanalytics import TextAnalyticsClient
-from azure.core.credentials import AzureKeyCredential
-from azure.identity import DefaultAzureCredential
-from openai import AzureOpenAI
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import queue
+import struct
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, ClassVar, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .settings import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+    import azure.cognitiveservices.speech as speechsdk
+    from azure.ai.textanalytics import TextAnalyticsClient
+    from openai import AsyncAzureOpenAI, AzureOpenAI
+
+logger = logging.getLogger(__name__)
+
+_azure_executor: Optional[ThreadPoolExecutor] = None
+_azure_executor_lock = threading.Lock()
+
+SILENCE_RMS_THRESHOLD = 200
+MIN_AUDIO_SECONDS = 1.0
+# Slack on top of the clip length before a recognition that never reports back is abandoned
+STT_TIMEOUT_MARGIN_SECONDS = 15.0
+PCM16_BYTES_PER_SECOND = 32000
+# Conservative (low) average bitrates so duration estimates never under-count
+COMPRESSED_BYTES_PER_SECOND = {"OGG_OPUS": 750, "MP3": 4000}
+HEALTH_ENTITIES_BATCH_SIZE = 10
+SENTIMENT_BATCH_SIZE = 10
+HEALTH_ENTITIES_CACHE_SIZE = 4096
+# Pools are keyed by client-supplied language and WAV format, so cap how many stay warm
+STT_POOL_MAX_KEYS = 8
+
+
+WAVE_FORMAT_PCM = 1
+_RIFF_SIG = b'RIFF'
+_WAVE_SIG = b'WAVE'
+_CHUNK_HEADER = struct.Struct("<4sI")
+_FMT_CHUNK = struct.Struct("<HHIIHH")
+
+
+def azure_executor() -> ThreadPoolExecutor:
+    # Built on first use so AZURE_WORKERS from .env is loaded before the pool is sized
+    global _azure_executor
+    if _azure_executor is None:
+        with _azure_executor_lock:
+            if _azure_executor is None:
+                _azure_executor = ThreadPoolExecutor(
+                    max_workers=get_settings().azure_workers,
+                    thread_name_prefix="azure"
+                )
+    return _azure_executor
+
+
+def _detect_compressed_container(audio_data: bytes) -> Optional[str]:
+    if audio_data.startswith(b'OggS'):
+        return "OGG_OPUS"
+    if audio_data.startswith(b'ID3') or audio_data.startswith(b'\xff\xfb'):
+        return "MP3"
+    return None
+
+
+def _pcm16_rms(pcm_data: bytes) -> float:
+    import numpy as np
+    
+    samples = np.frombuffer(pcm_data, dtype="<i2", count=len(pcm_data) // 2)
+    if not samples.size:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+
+def _decode_wav(audio_data: bytes) -> Tuple[bytes, int, int, int]:
+    if audio_data.startswith(_RIFF_SIG) and audio_data.startswith(_WAVE_SIG, 8):
+        fmt = None
+        offset = 12
+        while offset + _CHUNK_HEADER.size <= len(audio_data):
+            chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(audio_data, offset)
+            body = offset + _CHUNK_HEADER.size
+            if chunk_id == b'fmt ' and chunk_size >= _FMT_CHUNK.size and body + _FMT_CHUNK.size <= len(audio_data):
+                fmt = _FMT_CHUNK.unpack_from(audio_data, body)
+            elif chunk_id == b'data':
+                if fmt is not None and fmt[0] == WAVE_FORMAT_PCM:
+                    _, channels, sample_rate, _, _, bits_per_sample = fmt
+                    return audio_data[body:body + chunk_size], sample_rate, channels, bits_per_sample
+                break
+            offset = body + chunk_size + (chunk_size & 1)
+    
+    with wave.open(io.BytesIO(audio_data), 'rb') as wav_file:
+        sample_rate = wav_file.getframerate()
+        channels = wav_file.getnchannels()
+        bits_per_sample = wav_file.getsampwidth() * 8
+        pcm_data = wav_file.readframes(wav_file.getnframes())
+    return pcm_data, sample_rate, channels, bits_per_sample
+
+
+class STTBusyError(RuntimeError):
+    pass
+
+
+class STTScheduler:
+    
+    def __init__(self, interactive_slots: int, background_slots: int, background_queue: int, streaming_slots: int):
+        self._interactive = asyncio.Semaphore(interactive_slots)
+        self._background = asyncio.Semaphore(background_slots)
+        self._streaming = asyncio.Semaphore(streaming_slots)
+        self.background_queue = background_queue
+        self._background_waiting = 0
+    
+    async def acquire(self, priority: str) -> asyncio.Semaphore:
+        if priority == "streaming":
+            # Live sessions hold their slot for minutes, so they are refused rather than queued
+            if self._streaming.locked():
+                raise STTBusyError("All live transcription sessions are in use. Please try again shortly.")
+            await self._streaming.acquire()
+            return self._streaming
+        if priority == "background":
+            if self._background_waiting >= self.background_queue:
+                raise STTBusyError("Transcription service is busy. Please try again shortly.")
+            self._background_waiting += 1
+            try:
+                await self._background.acquire()
+            finally:
+                self._background_waiting -= 1
+            return self._background
+        await self._interactive.acquire()
+        return self._interactive
+    
+    async def run(self, priority: str, job):
+        semaphore = await self.acquire(priority)
+        try:
+            return await job()
+        finally:
+            semaphore.release()
 
 
 class AzureClients:
     
+    _shared_clients: ClassVar[Dict[tuple, Any]] = {}
+    _shared_locks: ClassVar[Dict[str, threading.Lock]] = {
+        "speech": threading.Lock(),
+        "openai": threading.Lock(),
+        "ta": threading.Lock(),
+        "http": threading.Lock(),
+        "async_http": threading.Lock()
+    }
+    
     def __init__(self):
-        self.speech_key = os.getenv("AZURE_SPEECH_KEY")
-        self.speech_region = os.getenv("AZURE_SPEECH_REGION", "eastus")
+        settings = get_settings()
+        self.speech_key = settings.azure_speech_key
+        self.speech_region = settings.azure_speech_region
         
         if not self.speech_key:
-            print("WARNING: AZURE_SPEECH_KEY not found in environment variables")
+            logger.warning("AZURE_SPEECH_KEY not found in environment variables")
         
-        endpoint_raw = os.getenv("AZURE_OPENAI_ENDPOINT")
-        self.openai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        self.openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
-        self.openai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
+        endpoint_raw = settings.azure_openai_endpoint
+        self.openai_api_key = settings.azure_openai_api_key
+        self.openai_api_version = settings.azure_openai_api_version
+        self.openai_deployment = settings.azure_openai_deployment or "gpt-4o"
+        # Batch jobs only run on a GlobalBatch deployment, never on the realtime one
+        self.openai_batch_deployment = settings.azure_openai_batch_deployment
         
         if endpoint_raw:
             if '/openai/deployments' in endpoint_raw:
-                print("WARNING: AZURE_OPENAI_ENDPOINT contains full API path. Extracting base endpoint...")
-                from urllib.parse import urlparse
+                logger.warning("AZURE_OPENAI_ENDPOINT contains full API path. Extracting base endpoint...")
                 parsed = urlparse(endpoint_raw)
                 self.openai_endpoint = f"{parsed.scheme}://{parsed.netloc}/"
-                print(f"Extracted base endpoint: {self.openai_endpoint}")
+                logger.debug("Extracted base endpoint: %s", self.openai_endpoint)
                 
                 if '/deployments/' in endpoint_raw:
                     parts = endpoint_raw.split('/deployments/')
                     if len(parts) > 1:
                         deployment_from_url = parts[1].split('/')[0].split('?')[0]
-                        if not os.getenv("AZURE_OPENAI_DEPLOYMENT"):
+                        if not settings.azure_openai_deployment:
                             self.openai_deployment = deployment_from_url
-                            print(f"Extracted deployment name from URL: {self.openai_deployment}")
+                            logger.debug("Extracted deployment name from URL: %s", self.openai_deployment)
             else:
                 self.openai_endpoint = endpoint_raw.rstrip('/')
         else:
             self.openai_endpoint = None
+        self._endpoint_clean = self.openai_endpoint.rstrip('/') if self.openai_endpoint else None
         
         if not self.openai_api_key:
-            print("WARNING: AZURE_OPENAI_API_KEY not found in environment variables")
+            logger.warning("AZURE_OPENAI_API_KEY not found in environment variables")
         if not self.openai_endpoint:
-            print("WARNING: AZURE_OPENAI_ENDPOINT not found in environment variables")
+            logger.warning("AZURE_OPENAI_ENDPOINT not found in environment variables")
+        
+        self.text_analytics_endpoint = settings.azure_text_analytics_endpoint
+        self.text_analytics_key = settings.azure_text_analytics_key
+        
+        self.stt_pool_size = settings.azure_stt_pool_size
+        self.stt_max_bytes = settings.azure_stt_max_bytes
+        self.stt_scheduler = STTScheduler(
+            interactive_slots=settings.azure_stt_interactive_slots,
+            background_slots=settings.azure_stt_background_slots,
+            background_queue=settings.azure_stt_background_queue,
+            streaming_slots=settings.azure_stt_streaming_slots
+        )
+        self._recognizer_pools: "OrderedDict[tuple, queue.Queue]" = OrderedDict()
+        self._refilling_pools = set()
+        self._pool_lock = threading.Lock()
         
-        self.text_analytics_endpoint = os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT")
-        self.text_analytics_key = os.getenv("AZURE_TEXT_ANALYTICS_KEY")
+        self.entity_batch_window = settings.azure_ta_batch_window_ms / 1000
+        self._pending_entities: List[Tuple[str, asyncio.Future]] = []
+        self._entity_flush_handle = None
+        self._entity_batch_tasks = set()
+        
+        self.entity_cache_ttl = settings.azure_ta_cache_ttl
+        self._entity_cache: OrderedDict = OrderedDict()
+        self._entity_cache_lock = threading.Lock()
+        self._refreshing_entities = set()
         
         self._speech_config = None
         self._openai_client = None
+        self._async_openai_client = None
         self._text_analytics_client = None
     
     @property
     def speech_config(self) -> Optional[speechsdk.SpeechConfig]:
-        try:
-            if not self._speech_config and self.speech_key:
-                self._speech_config = speechsdk.SpeechConfig(
-                    subscription=self.speech_key,
-                    region=self.speech_region
-                )
+        if self._speech_config is not None or not self.speech_key:
             return self._speech_config
-        except Exception as e:
-            print(f"Error creating Speech config: {e}")
-            return None
+        
+        import azure.cognitiveservices.speech as speechsdk
+        
+        key = ("speech", self.speech_key, self.speech_region)
+        with self._shared_locks["speech"]:
+            speech_config = self._shared_clients.get(key)
+            if speech_config is None:
+                try:
+                    speech_config = speechsdk.SpeechConfig(
+                        subscription=self.speech_key,
+                        region=self.speech_region
+                    )
+                except Exception as e:
+                    logger.error("Error creating Speech config: %s", e)
+                    return None
+                self._shared_clients[key] = speech_config
+        self._speech_config = speech_config
+        self.warm_speech_connections()
+        return self._speech_config
+    
+    @property
+    def http_client(self) -> httpx.Client:
+        http_client = self._shared_clients.get(("http",))
+        if http_client is None:
+            import httpx
+            
+            with self._shared_locks["http"]:
+                http_client = self._shared_clients.get(("http",))
+                if http_client is None:
+                    http_client = httpx.Client(
+                        timeout=30.0,
+                        limits=httpx.Limits(
+                            max_connections=get_settings().azure_http_pool,
+                            max_keepalive_connections=50
+                        )
+                    )
+                    self._shared_clients[("http",)] = http_client
+        return http_client
     
     @property
     def openai_client(self) -> Optional[AzureOpenAI]:
-        import sys
-        sys.stdout.flush()
-        try:
-            if not self._openai_client:
-                print("\n" + "="*60, flush=True)
-                print("=== ATTEMPTING OPENAI CLIENT INITIALIZATION ===", flush=True)
-                print("="*60, flush=True)
-                print(f"Endpoint value: {self.openai_endpoint}")
-                print(f"API Key present: {bool(self.openai_api_key)}")
-                print(f"API Key length: {len(self.openai_api_key) if self.openai_api_key else 0}")
-                print(f"Deployment: {self.openai_deployment}")
-                print(f"API Version: {self.openai_api_version}")
-                
-                if not self.openai_endpoint:
-                    print("ERROR: AZURE_OPENAI_ENDPOINT is not set")
-                    return None
-                if not self.openai_api_key:
-                    print("ERROR: AZURE_OPENAI_API_KEY is not set")
-                    return None
-                
-                endpoint_clean = self.openai_endpoint.rstrip('/')
-                print(f"Initializing OpenAI client with endpoint: {endpoint_clean}")
-                print(f"Using deployment: {self.openai_deployment}, API version: {self.openai_api_version}")
+        if self._openai_client is not None:
+            return self._openai_client
+        
+        if not self.openai_endpoint:
+            logger.error("AZURE_OPENAI_ENDPOINT is not set")
+            return None
+        if not self.openai_api_key:
+            logger.error("AZURE_OPENAI_API_KEY is not set")
+            return None
+        
+        key = ("openai", self._endpoint_clean, self.openai_api_key, self.openai_api_version)
+        with self._shared_locks["openai"]:
+            openai_client = self._shared_clients.get(key)
+            if openai_client is None:
+                logger.debug("Initializing OpenAI client with endpoint: %s", self._endpoint_clean)
+                logger.debug("Using deployment: %s, API version: %s", self.openai_deployment, self.openai_api_version)
                 
                 try:
-                    self._openai_client = AzureOpenAI(
+                    from openai import AzureOpenAI
+                    
+                    openai_client = AzureOpenAI(
                         api_version=self.openai_api_version,
-                        azure_endpoint=endpoint_clean,
-                        api_key=self.openai_api_key
+                        azure_endpoint=self._endpoint_clean,
+                        api_key=self.openai_api_key,
+                        http_client=self.http_client
                     )
-                    print("SUCCESS: OpenAI client initialized successfully!")
-                except Exception as init_error:
-                    print(f"FAILED to create AzureOpenAI client: {init_error}")
-                    print(f"Error type: {type(init_error).__name__}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.info("OpenAI client initialized")
+                except Exception:
+                    logger.exception("Failed to create AzureOpenAI client")
                     return None
-            else:
-                print("OpenAI client already initialized (reusing existing)")
-            return self._openai_client
-        except Exception as e:
-            print(f"ERROR in openai_client property: {e}")
-            import traceback
-            traceback.print_exc()
+                self._shared_clients[key] = openai_client
+        self._openai_client = openai_client
+        return self._openai_client
+    
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        http_client = self._shared_clients.get(("async_http",))
+        if http_client is None:
+            import httpx
+            
+            with self._shared_locks["async_http"]:
+                http_client = self._shared_clients.get(("async_http",))
+                if http_client is None:
+                    http_client = httpx.AsyncClient(
+                        timeout=30.0,
+                        limits=httpx.Limits(
+                            max_connections=get_settings().azure_http_pool,
+                            max_keepalive_connections=50
+                        )
+                    )
+                    self._shared_clients[("async_http",)] = http_client
+        return http_client
+    
+    @property
+    def async_openai_client(self) -> Optional[AsyncAzureOpenAI]:
+        if self._async_openai_client is not None:
+            return self._async_openai_client
+        if not (self.openai_endpoint and self.openai_api_key):
             return None
+        
+        key = ("async_openai", self._endpoint_clean, self.openai_api_key, self.openai_api_version)
+        with self._shared_locks["openai"]:
+            openai_client = self._shared_clients.get(key)
+            if openai_client is None:
+                try:
+                    from openai import AsyncAzureOpenAI
+                    
+                    openai_client = AsyncAzureOpenAI(
+                        api_version=self.openai_api_version,
+                        azure_endpoint=self._endpoint_clean,
+                        api_key=self.openai_api_key,
+                        http_client=self.async_http_client
+                    )
+                except Exception:
+                    logger.exception("Failed to create AsyncAzureOpenAI client")
+                    return None
+                self._shared_clients[key] = openai_client
+        self._async_openai_client = openai_client
+        return self._async_openai_client
     
     @property
     def text_analytics_client(self) -> Optional[TextAnalyticsClient]:
-        if not self._text_analytics_client and self.text_analytics_endpoint and self.text_analytics_key:
-            credential = AzureKeyCredential(self.text_analytics_key)
-            self._text_analytics_client = TextAnalyticsClient(
-                endpoint=self.text_analytics_endpoint,
-                credential=credential
-            )
+        if self._text_analytics_client is not None or not (self.text_analytics_endpoint and self.text_analytics_key):
+            return self._text_analytics_client
+        
+        from azure.ai.textanalytics import TextAnalyticsClient
+        from azure.core.credentials import AzureKeyCredential
+        
+        key = ("ta", self.text_analytics_endpoint, self.text_analytics_key)
+        with self._shared_locks["ta"]:
+            text_analytics_client = self._shared_clients.get(key)
+            if text_analytics_client is None:
+                credential = AzureKeyCredential(self.text_analytics_key)
+                text_analytics_client = TextAnalyticsClient(
+                    endpoint=self.text_analytics_endpoint,
+                    credential=credential
+                )
+                self._shared_clients[key] = text_analytics_client
+        self._text_analytics_client = text_analytics_client
         return self._text_analytics_client
     
-    def transcribe_audio(self, audio_data: bytes, language: str = "en-US") -> str:
-        if not self.speech_config:
-            raise ValueError("Azure Speech service not configured")
-        
-        if len(audio_data) < 1000:
-            raise ValueError("Audio file is too short. Please record at least 1-2 seconds of audio.")
-        
-        import io
-        import wave
-        
-        sample_rate = 16000
-        channels = 1
-        bits_per_sample = 16
+    def _build_recognizer(self, language: str, sample_rate: int, bits_per_sample: int, channels: int, container: Optional[str] = None):
+        import azure.cognitiveservices.speech as speechsdk
         
         try:
-            audio_io = io.BytesIO(audio_data)
-            with wave.open(audio_io, 'rb') as wav_file:
-                sample_rate = wav_file.getframerate()
-                channels = wav_file.getnchannels()
-                bits_per_sample = wav_file.getsampwidth() * 8
-                frames = wav_file.getnframes()
-                print(f"WAV file detected: {sample_rate}Hz, {channels} channel(s), {bits_per_sample}bit, {frames} frames")
-                
-                audio_io.seek(0)
-                audio_data = audio_io.read()
-        except Exception as e:
-            print(f"Not a standard WAV file or error reading: {e}")
-            pass
-        
-        try:
-            stream_format = speechsdk.audio.AudioStreamFormat(
-                samples_per_second=sample_rate,
-                bits_per_sample=bits_per_sample,
-                channels=channels
-            )
+            if container:
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    compressed_stream_format=getattr(speechsdk.AudioStreamContainerFormat, container)
+                )
+            else:
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    samples_per_second=sample_rate,
+                    bits_per_sample=bits_per_sample,
+                    channels=channels
+                )
         except Exception as e:
-            print(f"Error creating stream format: {e}, using defaults")
+            logger.warning("Error creating stream format: %s, using defaults", e)
             stream_format = speechsdk.audio.AudioStreamFormat(
                 samples_per_second=16000,
                 bits_per_sample=16,
@@ -168,78 +393,230 @@ class AzureClients:
             )
         
         push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        audio_config = speechsdk.audio.AudioConfig(stream=push_stream)
         
-        pcm_data = audio_data
-        if audio_data[:4] == b'RIFF' and audio_data[8:12] == b'WAVE':
+        recognizer = speechsdk.SpeechRecognizer(
+            speech_config=self.speech_config,
+            audio_config=audio_config,
+            language=language
+        )
+        return recognizer, push_stream
+    
+    def _refill_recognizer_pool(self, key: tuple, pool: queue.Queue):
+        import azure.cognitiveservices.speech as speechsdk
+        
+        try:
+            while not pool.full() and self._recognizer_pools.get(key) is pool:
+                recognizer, push_stream = self._build_recognizer(*key)
+                speechsdk.Connection.from_recognizer(recognizer).open(True)
+                pool.put_nowait((recognizer, push_stream))
+        except Exception as e:
+            logger.warning("Error warming speech recognizer pool: %s", e)
+        finally:
+            with self._pool_lock:
+                self._refilling_pools.discard(key)
+                evicted = self._recognizer_pools.get(key) is not pool
+            if evicted:
+                self._close_recognizer_pool(pool)
+    
+    def _close_recognizer_pool(self, pool: queue.Queue):
+        import azure.cognitiveservices.speech as speechsdk
+        
+        while True:
+            try:
+                recognizer, push_stream = pool.get_nowait()
+            except queue.Empty:
+                return
             try:
-                audio_io = io.BytesIO(audio_data)
-                with wave.open(audio_io, 'rb') as wav_file:
-                    pcm_data = wav_file.readframes(wav_file.getnframes())
-                    print(f"Extracted {len(pcm_data)} bytes of PCM data from WAV file")
+                push_stream.close()
+                speechsdk.Connection.from_recognizer(recognizer).close()
             except Exception as e:
-                print(f"Error extracting PCM from WAV: {e}, using raw data")
-                pcm_data = audio_data
-        else:
+                logger.debug("Error closing pooled speech recognizer: %s", e)
+    
+    def _recognizer_pool(self, key: tuple) -> Tuple[queue.Queue, bool]:
+        evicted = []
+        with self._pool_lock:
+            pool = self._recognizer_pools.get(key)
+            if pool is None:
+                pool = queue.Queue(maxsize=self.stt_pool_size)
+                self._recognizer_pools[key] = pool
+                while len(self._recognizer_pools) > STT_POOL_MAX_KEYS:
+                    evicted_key, evicted_pool = self._recognizer_pools.popitem(last=False)
+                    # A running refill closes its own pool once it sees the eviction
+                    if evicted_key not in self._refilling_pools:
+                        evicted.append(evicted_pool)
+            else:
+                self._recognizer_pools.move_to_end(key)
+            start_refill = self.stt_pool_size > 0 and key not in self._refilling_pools
+            if start_refill:
+                self._refilling_pools.add(key)
+        for evicted_pool in evicted:
+            self._close_recognizer_pool(evicted_pool)
+        return pool, start_refill
+    
+    def warm_speech_connections(self, language: str = "en-US"):
+        key = (language, 16000, 16, 1, None)
+        pool, start_refill = self._recognizer_pool(key)
+        if start_refill:
+            threading.Thread(target=self._refill_recognizer_pool, args=(key, pool), daemon=True).start()
+    
+    def _acquire_recognizer(self, language: str, sample_rate: int, bits_per_sample: int, channels: int, container: Optional[str] = None):
+        key = (language, sample_rate, bits_per_sample, channels, container)
+        pool, start_refill = self._recognizer_pool(key)
+        
+        try:
+            recognizer, push_stream = pool.get_nowait()
+        except queue.Empty:
+            recognizer, push_stream = self._build_recognizer(*key)
+        
+        if start_refill:
+            threading.Thread(target=self._refill_recognizer_pool, args=(key, pool), daemon=True).start()
+        
+        return recognizer, push_stream
+    
+    def _prepare_recognizer(self, audio_data: bytes, language: str) -> Tuple[Any, float]:
+        if not self.speech_config:
+            raise ValueError("Azure Speech service not configured")
+        
+        container = _detect_compressed_container(audio_data)
+        if container:
+            logger.debug("Compressed %s audio detected, streaming %s bytes as-is", container, len(audio_data))
             pcm_data = audio_data
+            sample_rate = 16000
+            channels = 1
+            bits_per_sample = 16
+            duration = len(audio_data) / COMPRESSED_BYTES_PER_SECOND[container]
+        else:
+            try:
+                pcm_data, sample_rate, channels, bits_per_sample = _decode_wav(audio_data)
+                logger.debug("WAV file detected: %sHz, %s channel(s), %sbit, %s bytes of PCM data", sample_rate, channels, bits_per_sample, len(pcm_data))
+                duration = len(pcm_data) / (sample_rate * channels * bits_per_sample // 8 or 1)
+            except Exception as e:
+                logger.debug("Not a standard WAV file or error reading: %s, using raw data", e)
+                pcm_data = audio_data
+                sample_rate = 16000
+                channels = 1
+                bits_per_sample = 16
+                duration = None
         
-        chunk_size = 4096
-        audio_io = io.BytesIO(pcm_data)
-        bytes_written = 0
-        while True:
-            chunk = audio_io.read(chunk_size)
-            if not chunk:
-                break
-            push_stream.write(chunk)
-            bytes_written += len(chunk)
+        too_short = len(audio_data) < 1000 if duration is None else duration < MIN_AUDIO_SECONDS
+        if too_short:
+            raise ValueError("Audio file is too short. Please record at least 1-2 seconds of audio.")
+        
+        if len(pcm_data) > self.stt_max_bytes:
+            raise ValueError(
+                f"Audio is too long for real-time transcription ({len(pcm_data)} bytes, limit {self.stt_max_bytes}). "
+                "Please record a shorter clip."
+            )
+        if not container and bits_per_sample == 16 and _pcm16_rms(pcm_data) < SILENCE_RMS_THRESHOLD:
+            raise ValueError("The recording appears to be silent. Please check your microphone and try again.")
         
-        print(f"Wrote {bytes_written} bytes to audio stream")
+        recognizer, push_stream = self._acquire_recognizer(language, sample_rate, bits_per_sample, channels, container)
+        
+        push_stream.write(pcm_data)
+        logger.debug("Wrote %s bytes to audio stream", len(pcm_data))
         push_stream.close()
         
-        audio_config = speechsdk.audio.AudioConfig(stream=push_stream)
+        if duration is None:
+            duration = len(pcm_data) / PCM16_BYTES_PER_SECOND
+        return recognizer, duration
+    
+    async def warm_http_connections(self, *urls: str):
+        targets = [url for url in (self._endpoint_clean, self.text_analytics_endpoint, *urls) if url]
+        client = self.async_http_client
+        probes = [client.head(url, timeout=5.0) for url in targets]
+        if self._endpoint_clean and self.async_openai_client is None:
+            logger.debug("Async OpenAI client unavailable during connection prewarm")
+        results = await asyncio.gather(*probes, return_exceptions=True)
+        for url, result in zip(targets, results):
+            if isinstance(result, Exception):
+                logger.debug("Connection prewarm to %s failed: %s", url, result)
+    
+    async def aclose(self):
+        # OpenAI clients are bound to the pools closed below, so drop them for the next lifespan
+        with self._shared_locks["openai"]:
+            for key in [key for key in self._shared_clients if key[0] in ("openai", "async_openai")]:
+                del self._shared_clients[key]
+        self._openai_client = None
+        self._async_openai_client = None
+        async_http_client = self._shared_clients.pop(("async_http",), None)
+        if async_http_client is not None:
+            await async_http_client.aclose()
+        http_client = self._shared_clients.pop(("http",), None)
+        if http_client is not None:
+            http_client.close()
+    
+    async def run_blocking(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(azure_executor(), functools.partial(func, *args, **kwargs))
+    
+    async def transcribe_audio_async(self, audio_data: bytes, language: str = "en-US", *, priority: str = "interactive") -> str:
+        return await self.stt_scheduler.run(priority, lambda: self._recognize_async(audio_data, language))
+    
+    async def _recognize_async(self, audio_data: bytes, language: str) -> str:
+        import azure.cognitiveservices.speech as speechsdk
         
-        recognizer = speechsdk.SpeechRecognizer(
-            speech_config=self.speech_config,
-            audio_config=audio_config,
-            language=language
-        )
+        recognizer, duration = await self.run_blocking(self._prepare_recognizer, audio_data, language)
+        
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        segments = []
+        
+        def finish(error: Optional[Exception] = None):
+            if done.done():
+                return
+            if error:
+                done.set_exception(error)
+            else:
+                done.set_result(None)
         
-        print("Starting speech recognition...")
-        result = recognizer.recognize_once_async().get()
-        print(f"Recognition result reason: {result.reason}")
-        
-        if result.reason == speechsdk.ResultReason.RecognizedSpeech:
-            text = result.text.strip()
-            if not text:
-                raise ValueError("Speech was recognized but no text was returned. Please try speaking more clearly.")
-            print(f"Recognized text: {text}")
-            return text
-        elif result.reason == speechsdk.ResultReason.NoMatch:
-            no_match_details = speechsdk.NoMatchDetails(result)
-            error_msg = (
+        def recognized_cb(evt):
+            if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                text = evt.result.text.strip()
+                if text:
+                    segments.append(text)
+        
+        def canceled_cb(evt):
+            cancellation = evt.cancellation_details
+            if cancellation.reason == speechsdk.CancellationReason.Error:
+                error_msg = f"Speech recognition canceled: {cancellation.reason}"
+                error_msg += f"\nError details: {cancellation.error_details}"
+                loop.call_soon_threadsafe(finish, ValueError(error_msg))
+        
+        def session_stopped_cb(evt):
+            loop.call_soon_threadsafe(finish)
+        
+        recognizer.recognized.connect(recognized_cb)
+        recognizer.canceled.connect(canceled_cb)
+        recognizer.session_stopped.connect(session_stopped_cb)
+        
+        logger.debug("Starting async speech recognition...")
+        await self.run_blocking(recognizer.start_continuous_recognition_async().get)
+        try:
+            await asyncio.wait_for(done, timeout=duration + STT_TIMEOUT_MARGIN_SECONDS)
+        except asyncio.TimeoutError:
+            raise ValueError("Speech recognition timed out. Please try again.")
+        finally:
+            await self.run_blocking(recognizer.stop_continuous_recognition_async().get)
+        
+        text = " ".join(segments)
+        if not text:
+            raise ValueError(
                 "No speech could be recognized. Please try:\n"
                 "- Speaking clearly and loudly\n"
                 "- Recording for at least 2-3 seconds\n"
                 "- Ensuring your microphone is working\n"
-                "- Reducing background noise\n"
-                f"Reason: {no_match_details.reason}"
+                "- Reducing background noise"
             )
-            raise ValueError(error_msg)
-        elif result.reason == speechsdk.ResultReason.Canceled:
-            cancellation = speechsdk.CancellationDetails(result)
-            error_msg = f"Speech recognition canceled: {cancellation.reason}"
-            if cancellation.reason == speechsdk.CancellationReason.Error:
-                error_msg += f"\nError details: {cancellation.error_details}"
-            raise ValueError(error_msg)
-        else:
-            raise ValueError(f"Speech recognition failed with reason: {result.reason}")
+        logger.debug("Recognized text: %s", text)
+        return text
     
     def start_continuous_recognition(self, callback, language: str = "en-US"):
+        import azure.cognitiveservices.speech as speechsdk
+        
         if not self.speech_config:
             raise ValueError("Azure Speech service not configured")
         
-        import io
-        import wave
-        
         stream_format = speechsdk.audio.AudioStreamFormat(
             samples_per_second=16000,
             bits_per_sample=16,
@@ -280,39 +657,129 @@ class AzureClients:
         
         return recognizer, push_stream
     
-    def extract_health_entities(self, text: str) -> dict:
+    async def extract_health_entities(self, text: str) -> dict:
         if not self.text_analytics_client:
             raise ValueError("Text Analytics service not configured")
         
-        documents = [text]
-        result = self.text_analytics_client.analyze_healthcare_entities(documents)
-        
-        docs = [doc for doc in result if not doc.is_error]
-        if not docs:
-            return {"entities": [], "relations": []}
-        
-        doc_result = docs[0]
-        entities = []
-        for entity in doc_result.entities:
-            entities.append({
-                "text": entity.text,
-                "category": entity.category,
-                "confidence": entity.confidence_score,
-                "offset": entity.offset,
-                "length": entity.length
-            })
-        
-        relations = []
-        for relation in doc_result.entity_relations:
-            relations.append({
-                "relation_type": relation.relation_type,
-                "roles": [
-                    {
-                        "entity": role.entity.text,
-                        "name": role.name
-                    }
-                    for role in relation.roles
-                ]
-            })
-        
-        return {"entities": entities, "relations": relations}
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._entity_cache_lock:
+            cached = self._entity_cache.get(key)
+            if cached is not None:
+                self._entity_cache.move_to_end(key)
+        
+        if cached is not None:
+            stored_at, result = cached
+            age = time.monotonic() - stored_at
+            if age < self.entity_cache_ttl:
+                if age > self.entity_cache_ttl / 2 and key not in self._refreshing_entities:
+                    self._refreshing_entities.add(key)
+                    task = asyncio.ensure_future(self._refresh_health_entities(text, key))
+                    self._entity_batch_tasks.add(task)
+                    task.add_done_callback(self._entity_batch_tasks.discard)
+                return result
+        
+        return await self._fetch_health_entities(text, key)
+    
+    async def _refresh_health_entities(self, text: str, key: bytes):
+        try:
+            await self._fetch_health_entities(text, key)
+        except Exception as e:
+            logger.warning("Error refreshing cached health entities: %s", e)
+        finally:
+            self._refreshing_entities.discard(key)
+    
+    async def _fetch_health_entities(self, text: str, key: bytes) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_entities.append((text, future))
+        
+        if len(self._pending_entities) >= HEALTH_ENTITIES_BATCH_SIZE:
+            self._flush_entity_batches()
+        elif self._entity_flush_handle is None:
+            self._entity_flush_handle = loop.call_later(self.entity_batch_window, self._flush_entity_batches)
+        
+        result = await future
+        with self._entity_cache_lock:
+            self._entity_cache[key] = (time.monotonic(), result)
+            self._entity_cache.move_to_end(key)
+            while len(self._entity_cache) > HEALTH_ENTITIES_CACHE_SIZE:
+                self._entity_cache.popitem(last=False)
+        return result
+    
+    def _flush_entity_batches(self):
+        if self._entity_flush_handle is not None:
+            self._entity_flush_handle.cancel()
+            self._entity_flush_handle = None
+        
+        while self._pending_entities:
+            batch = self._pending_entities[:HEALTH_ENTITIES_BATCH_SIZE]
+            self._pending_entities = self._pending_entities[HEALTH_ENTITIES_BATCH_SIZE:]
+            task = asyncio.ensure_future(self._dispatch_entity_batch(batch))
+            self._entity_batch_tasks.add(task)
+            task.add_done_callback(self._entity_batch_tasks.discard)
+    
+    async def _dispatch_entity_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            results = await self.run_blocking(self._analyze_health_entities_batch, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+    
+    def _analyze_health_entities_batch(self, texts: List[str]) -> List[dict]:
+        poller = self.text_analytics_client.begin_analyze_healthcare_entities(texts)
+        
+        results = []
+        for doc_result in poller.result():
+            if doc_result.is_error:
+                results.append({"entities": [], "relations": []})
+                continue
+            
+            entities = [
+                {
+                    "text": entity.text,
+                    "category": entity.category,
+                    "confidence": entity.confidence_score,
+                    "offset": entity.offset,
+                    "length": entity.length
+                }
+                for entity in doc_result.entities
+            ]
+            
+            relations = [
+                {
+                    "relation_type": relation.relation_type,
+                    "roles": [
+                        {
+                            "entity": role.entity.text,
+                            "name": role.name
+                        }
+                        for role in relation.roles
+                    ]
+                }
+                for relation in doc_result.entity_relations
+            ]
+            
+            results.append({"entities": entities, "relations": relations})
+        
+        return results
+    
+    def analyze_sentiment_batch(self, texts: List[str]) -> List[Optional[str]]:
+        client = self.text_analytics_client
+        if client is None:
+            return [None] * len(texts)
+        
+        results = []
+        try:
+            for start in range(0, len(texts), SENTIMENT_BATCH_SIZE):
+                for doc_result in client.analyze_sentiment(texts[start:start + SENTIMENT_BATCH_SIZE]):
+                    results.append(None if doc_result.is_error else doc_result.sentiment)
+        except Exception as e:
+            logger.error("Sentiment analysis failed: %s", e)
+            return [None] * len(texts)
+        return results
@@ -1,52 +1,170 @@
-import os
-import json
-import uuid
-from datetime import datetime
-from typing import List, Dict, Any
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, WebSocket, WebSocketDisconnect
+import orjson
+import re
+import secrets
+import time
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 import asyncio
-import threading
+import atexit
+import logging
+import logging.handlers
+import queue
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import httpx
+import ciso8601
 
-from .azure_clients import AzureClients
+from .azure_clients import AzureClients, STTBusyError, COMPRESSED_BYTES_PER_SECOND, _detect_compressed_container
+from .settings import get_settings
 from .schemas import (
-    DiaryEntryRequest, DiaryEntryResponse, DiarySummaryResponse,
-    ClinicalNoteRequest, ClinicalNoteResponse, SOAPNote, ErrorResponse
+    DiaryEntryRequest, DiaryEntryResponse, DiaryEntriesBatchResponse, DiarySummaryResponse,
+    ClinicalNoteResponse
 )
-from .pipeline import DiaryPipeline, SOAPPipeline
-from .utils_audio import decode_audio_base64, validate_audio_format
+from .pipeline import DiaryPipeline, SOAPPipeline, SENTIMENT_BATCH_MIN_ENTRIES
+from .utils_audio import decode_audio_base64, get_audio_duration, validate_audio_format, validate_audio_header_b64
 
 import pathlib
-try:
-    backend_dir = pathlib.Path(__file__).parent.parent
-    env_path = backend_dir / ".env"
-    if env_path.exists():
-        load_dotenv(env_path, override=True)
-        print(f"Loaded .env from: {env_path} (override=True)")
-    else:
-        load_dotenv(override=True)
-        print("Loaded .env from current directory (override=True)")
-except Exception as e:
-    print(f"Warning: Error loading .env file: {e}")
-    load_dotenv(override=True)
+
+load_dotenv(pathlib.Path(__file__).parent.parent / ".env", override=True) or load_dotenv(override=True)
+
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(), respect_handler_level=True)
+logging.basicConfig(
+    level=get_settings().log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logger = logging.getLogger(__name__)
 
 DOCTORS_FILE = pathlib.Path(__file__).parent / "doctors.json"
 
-from starlette.requests import Request
-from starlette.datastructures import UploadFile as StarletteUploadFile
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _health_task, _redis
+    redis_url = get_settings().redis_url
+    if redis_url:
+        import redis.asyncio as redis
+        
+        _redis = redis.from_url(redis_url)
+        try:
+            await _load_diary_entries()
+        except Exception as e:
+            logger.error("Failed to load diary entries from Redis: %s", e)
+    results = await asyncio.gather(
+        asyncio.to_thread(lambda: azure_clients.speech_config),
+        asyncio.to_thread(lambda: azure_clients.text_analytics_client),
+        azure_clients.warm_http_connections(NPI_API_URL, soap_pipeline.nlm_api_base),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("Startup client initialization failed: %s", result)
+    _health_task = asyncio.create_task(_refresh_health_loop())
+    sweep_task = asyncio.create_task(_sweep_diary_entries_loop()) if DIARY_ENTRY_TTL_DAYS > 0 else None
+    try:
+        yield
+    finally:
+        _health_task.cancel()
+        if sweep_task is not None:
+            sweep_task.cancel()
+        if _redis is not None:
+            await _redis.aclose()
+        await azure_clients.aclose()
+
 
 app = FastAPI(
     title="Healthcare AI Assistant",
     description="AI-powered health diary summarizer and clinical note cleaner",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-import starlette.requests
-original_max_content_length = getattr(starlette.requests.Request, 'max_content_length', None)
-starlette.requests.Request.max_content_length = 10 * 1024 * 1024
+MAX_REQUEST_BYTES = get_settings().max_request_bytes
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    response = ORJSONResponse(status_code=400, content={"detail": "Invalid Content-Length header"})
+                    await response(scope, receive, send)
+                    return
+                if declared > self.max_bytes:
+                    response = ORJSONResponse(status_code=413, content={"detail": "Request body too large"})
+                    await response(scope, receive, send)
+                    return
+                break
+        
+        received = 0
+        response_started = False
+        rejected = False
+        
+        async def send_tracked(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
+        async def receive_limited():
+            # Chunked uploads carry no Content-Length, so count what actually arrives
+            nonlocal received, rejected
+            if received > self.max_bytes:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Answer 413 here and report a disconnect so the endpoint stops reading;
+                    # whatever it tries to send afterwards is dropped.
+                    if not response_started:
+                        response = ORJSONResponse(status_code=413, content={"detail": "Request body too large"})
+                        await response(scope, receive, send)
+                        rejected = True
+                    return {"type": "http.disconnect"}
+            return message
+        
+        await self.app(scope, receive_limited, send_tracked)
+
+
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BYTES)
+
+
+class EventStreamAwareGZipMiddleware(GZipMiddleware):
+    # GZip holds streamed output in its compressor until it has enough to emit, which
+    # would delay every SSE frame, so requests that accept text/event-stream skip it.
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"accept" and b"text/event-stream" in value:
+                    await self.app(scope, receive, send)
+                    return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(EventStreamAwareGZipMiddleware, minimum_size=1024)
 
 app.add_middleware(
     CORSMiddleware,
@@ -60,14 +178,158 @@ try:
     azure_clients = AzureClients()
     diary_pipeline = DiaryPipeline(azure_clients)
     soap_pipeline = SOAPPipeline(azure_clients)
-    print("Azure clients initialized successfully")
+    logger.info("Azure clients initialized successfully")
 except Exception as e:
-    print(f"Error initializing Azure clients: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.exception("Error initializing Azure clients: %s", e)
     raise
 
-diary_entries: List[Dict[str, Any]] = []
+NPI_API_URL = "https://npiregistry.cms.hhs.gov/api/"
+SPECIALTY_KEYWORDS = [
+    ("Cardiology", ["heart", "cardiac", "chest", "hypertension", "blood pressure", "arrhythmia"]),
+    ("Endocrinology", ["diabetes", "thyroid", "hormone", "metabolic", "insulin", "glucose"]),
+    ("Neurology", ["headache", "migraine", "neurological", "brain", "nerve", "seizure", "stroke"]),
+    ("Orthopedic Surgery", ["bone", "joint", "knee", "hip", "fracture", "arthritis"]),
+    ("Dermatology", ["skin", "rash", "dermatitis", "acne"]),
+    ("Gastroenterology", ["stomach", "digestive", "gastro", "nausea", "vomit"]),
+    ("Pulmonology", ["lung", "breathing", "asthma", "cough", "respiratory"]),
+]
+SPECIALTY_PATTERN = re.compile(
+    "(?=" + "|".join(f"(?P<s{i}>{'|'.join(map(re.escape, keywords))})" for i, (_, keywords) in enumerate(SPECIALTY_KEYWORDS)) + ")",
+    re.IGNORECASE
+)
+SPECIALTY_ORDER = {f"s{i}": i for i in range(len(SPECIALTY_KEYWORDS))}
+TAXONOMY_MAP = {
+    "family medicine": "Family Medicine",
+    "internal medicine": "Internal Medicine",
+    "cardiology": "Cardiology",
+    "endocrinology": "Endocrinology",
+    "neurology": "Neurology",
+    "orthopedic": "Orthopedic Surgery",
+    "orthopedics": "Orthopedic Surgery",
+    "dermatology": "Dermatology",
+    "gastroenterology": "Gastroenterology",
+    "pulmonology": "Pulmonology",
+    "rheumatology": "Rheumatology",
+    "psychiatry": "Psychiatry",
+    "pediatrics": "Pediatrics",
+    "obstetrics": "Obstetrics & Gynecology",
+    "gynecology": "Obstetrics & Gynecology",
+    "emergency": "Emergency Medicine"
+}
+EXACT_TAXONOMIES = {value.lower(): value for value in TAXONOMY_MAP.values()}
+SPECIALTY_CACHE_SIZE = 1024
+NPI_CACHE_SIZE = 512
+NPI_CACHE_TTL = get_settings().npi_cache_ttl
+_redis = None
+RANKING_CONTEXT_CHARS = 2000
+DOCTORS_MAX_AGE = 300
+ADDRESS_KEYS = ("address_1", "address_2", "city", "state", "postal_code")
+_npi_cache: "OrderedDict[tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_npi_inflight: Dict[tuple, asyncio.Future] = {}
+SOAP_SECTIONS = ("subjective", "objective", "assessment", "plan")
+SOAP_UPDATE_MIN_CHARS = 40
+SOAP_UPDATE_MAX_INTERVAL = 5.0
+WS_FLUSH_SECONDS = 5.0
+_specialty_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+DIARY_MAX_ENTRIES = get_settings().diary_max_entries
+DIARY_ENTRY_TTL_DAYS = get_settings().diary_entry_ttl_days
+DIARY_SWEEP_SECONDS = 3600
+DIARY_REDIS_KEY = "diary:entries"
+DIARY_ETAG_PREFIX = secrets.token_hex(4)
+diary_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+diary_version = 0
+_entries_cache: Optional[Tuple[int, bytes]] = None
+_summary_cache: Optional[Tuple[int, bytes]] = None
+_summary_lock = asyncio.Lock()
+
+
+def _store_diary_entries(entries: List[Dict[str, Any]]) -> List[str]:
+    global diary_version
+    stored_at = time.time()
+    for entry in entries:
+        entry["_response"] = DiaryEntryResponse.model_construct(
+            id=entry["id"],
+            text=entry["text"],
+            entry_type=entry["entry_type"],
+            timestamp=entry["timestamp"],
+            sentiment=entry.get("sentiment"),
+            summary=None,
+            suggestions=[]
+        ).model_dump(mode="json")
+        # Wall-clock insert time, persisted to Redis so the TTL survives restarts
+        entry["_stored_at"] = entry.get("_stored_at") or stored_at
+        diary_entries[entry["id"]] = entry
+        diary_entries.move_to_end(entry["id"])
+    evicted_ids = []
+    while len(diary_entries) > DIARY_MAX_ENTRIES:
+        evicted_id = diary_entries.popitem(last=False)[0]
+        logger.warning("Diary store reached DIARY_MAX_ENTRIES=%s, evicted entry %s", DIARY_MAX_ENTRIES, evicted_id)
+        evicted_ids.append(evicted_id)
+    diary_version += 1
+    return evicted_ids
+
+
+def _remove_diary_entry(entry_id: str) -> bool:
+    global diary_version
+    if diary_entries.pop(entry_id, None) is None:
+        return False
+    diary_version += 1
+    return True
+
+
+async def _sync_diary_redis(stored: List[Dict[str, Any]], removed_ids: List[str]):
+    if _redis is None:
+        return
+    try:
+        if stored:
+            await _redis.hset(DIARY_REDIS_KEY, mapping={entry["id"]: orjson.dumps({**entry["_response"], "_stored_at": entry["_stored_at"]}) for entry in stored})
+        if removed_ids:
+            await _redis.hdel(DIARY_REDIS_KEY, *removed_ids)
+    except Exception as e:
+        logger.warning("Redis diary sync failed: %s", e)
+
+
+async def _save_diary_entries(entries: List[Dict[str, Any]]):
+    evicted_ids = _store_diary_entries(entries)
+    await _sync_diary_redis(entries, evicted_ids)
+
+
+async def _load_diary_entries():
+    entries = []
+    for raw in await _redis.hvals(DIARY_REDIS_KEY):
+        data = orjson.loads(raw)
+        entries.append({
+            "id": data["id"],
+            "text": data["text"],
+            "entry_type": data["entry_type"],
+            "timestamp": ciso8601.parse_datetime(data["timestamp"]),
+            "sentiment": data.get("sentiment"),
+            "_stored_at": data.get("_stored_at")
+        })
+    if entries:
+        # Oldest insert first, so capacity eviction and the TTL sweep both start from the front
+        entries.sort(key=lambda entry: entry["_stored_at"] or float("inf"))
+        unstamped = [entry for entry in entries if entry["_stored_at"] is None]
+        evicted_ids = _store_diary_entries(entries)
+        await _sync_diary_redis([entry for entry in unstamped if entry["id"] in diary_entries], evicted_ids)
+        logger.info("Loaded %s diary entries from Redis", len(entries))
+
+
+async def _sweep_diary_entries_loop():
+    global diary_version
+    max_age = DIARY_ENTRY_TTL_DAYS * 86400
+    while True:
+        cutoff = time.time() - max_age
+        evicted_ids = []
+        while diary_entries and next(iter(diary_entries.values()))["_stored_at"] < cutoff:
+            evicted_ids.append(diary_entries.popitem(last=False)[0])
+        if evicted_ids:
+            diary_version += 1
+            await _sync_diary_redis([], evicted_ids)
+            logger.info("Evicted %s diary entries older than %g days", len(evicted_ids), DIARY_ENTRY_TTL_DAYS)
+        await asyncio.sleep(DIARY_SWEEP_SECONDS)
 
 
 @app.get("/")
@@ -81,35 +343,42 @@ async def root():
     }
 
 
-@app.get("/health")
-async def health_check():
+def _check_speech() -> bool:
     try:
-        speech_available = False
-        openai_available = False
-        text_analytics_available = False
-        
-        try:
-            speech_available = azure_clients.speech_config is not None
-        except Exception as e:
-            print(f"Speech service check failed: {e}")
-        
-        try:
-            client = azure_clients.openai_client
-            openai_available = client is not None
-            if not openai_available:
-                print("OpenAI client is None - checking environment variables...")
-                print(f"  Endpoint set: {bool(azure_clients.openai_endpoint)}")
-                print(f"  API key set: {bool(azure_clients.openai_api_key)}")
-        except Exception as e:
-            print(f"OpenAI service check failed: {e}")
-            import traceback
-            traceback.print_exc()
-            openai_available = False
-        
-        try:
-            text_analytics_available = azure_clients.text_analytics_client is not None
-        except Exception as e:
-            print(f"Text Analytics service check failed: {e}")
+        return azure_clients.speech_config is not None
+    except Exception as e:
+        logger.debug("Speech service check failed: %s", e)
+        return False
+
+
+def _check_openai() -> bool:
+    try:
+        client = azure_clients.async_openai_client
+        if client is None:
+            logger.debug("OpenAI client is None - checking environment variables...")
+            logger.debug("  Endpoint set: %s", bool(azure_clients.openai_endpoint))
+            logger.debug("  API key set: %s", bool(azure_clients.openai_api_key))
+        return client is not None
+    except Exception as e:
+        logger.exception("OpenAI service check failed: %s", e)
+        return False
+
+
+def _check_text_analytics() -> bool:
+    try:
+        return azure_clients.text_analytics_client is not None
+    except Exception as e:
+        logger.debug("Text Analytics service check failed: %s", e)
+        return False
+
+
+async def _build_health_snapshot() -> Dict[str, Any]:
+    try:
+        speech_available, openai_available, text_analytics_available = await asyncio.gather(
+            asyncio.to_thread(_check_speech),
+            asyncio.to_thread(_check_openai),
+            asyncio.to_thread(_check_text_analytics)
+        )
         
         return {
             "status": "healthy", 
@@ -130,7 +399,7 @@ async def health_check():
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
-        print(f"Health check error: {error_detail}")
+        logger.error("Health check error: %s", error_detail)
         return {
             "status": "error",
             "error": str(e),
@@ -141,46 +410,88 @@ async def health_check():
         }
 
 
+HEALTH_REFRESH_SECONDS = get_settings().health_refresh_seconds
+STT_INTERACTIVE_MAX_SECONDS = get_settings().stt_interactive_max_seconds
+_health_snapshot: Dict[str, Any] = {}
+_health_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_health_loop():
+    global _health_snapshot
+    while True:
+        _health_snapshot = await _build_health_snapshot()
+        await asyncio.sleep(HEALTH_REFRESH_SECONDS)
+
+
+@app.get("/health")
+async def health_check():
+    return _health_snapshot or await _build_health_snapshot()
+
+
+def _stt_priority(audio_bytes: bytes) -> str:
+    # The diary voice note and clinical dictation both upload to /api/clinical/transcribe,
+    # so classify by length: short clips are interactive, long dictations queue as background.
+    container = _detect_compressed_container(audio_bytes)
+    if container:
+        duration = len(audio_bytes) / COMPRESSED_BYTES_PER_SECOND[container]
+    else:
+        duration = get_audio_duration(audio_bytes)
+    return "interactive" if duration <= STT_INTERACTIVE_MAX_SECONDS else "background"
+
+
 @app.post("/api/diary/entry", response_model=DiaryEntryResponse)
 async def create_diary_entry(
     text: str = Form(None),
+    audio: UploadFile = File(None),
     audio_data: str = Form(None),
     entry_type: str = Form(...),
     timestamp: str = Form(None)
 ):
     try:
         transcribed_text = text
-        if audio_data and not text:
+        if (audio or audio_data) and not text:
             try:
-                audio_bytes = decode_audio_base64(audio_data)
-                is_valid, msg = validate_audio_format(audio_bytes)
+                if audio is not None:
+                    audio_bytes = await audio.read()
+                else:
+                    is_valid, msg = validate_audio_header_b64(audio_data)
+                    if not is_valid:
+                        raise HTTPException(status_code=400, detail=f"Invalid audio format: {msg}")
+                    audio_bytes = await asyncio.to_thread(decode_audio_base64, audio_data)
+                is_valid, msg = await asyncio.to_thread(validate_audio_format, audio_bytes)
                 if not is_valid:
                     raise HTTPException(status_code=400, detail=f"Invalid audio format: {msg}")
                 
-                transcribed_text = azure_clients.transcribe_audio(audio_bytes)
+                transcribed_text = await azure_clients.transcribe_audio_async(audio_bytes, priority=_stt_priority(audio_bytes))
+            except STTBusyError as e:
+                raise HTTPException(status_code=503, detail=str(e))
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Audio transcription failed: {str(e)}")
         
         if not transcribed_text:
             raise HTTPException(status_code=400, detail="Either text or audio_data must be provided")
         
-        entry_timestamp = datetime.now()
+        entry_timestamp = None
         if timestamp:
             try:
-                entry_timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-            except:
+                entry_timestamp = ciso8601.parse_datetime(timestamp)
+                if entry_timestamp.tzinfo is None:
+                    entry_timestamp = entry_timestamp.replace(tzinfo=timezone.utc)
+            except ValueError:
                 pass
+        if entry_timestamp is None:
+            entry_timestamp = datetime.now(timezone.utc)
         
         entry_dict = {
-            "id": str(uuid.uuid4()),
+            "id": secrets.token_hex(16),
             "text": transcribed_text,
             "entry_type": entry_type,
             "timestamp": entry_timestamp
         }
         
-        suggestions = diary_pipeline._generate_suggestions([entry_dict])
+        suggestions = await diary_pipeline._generate_suggestions_async([entry_dict])
         
-        diary_entries.append(entry_dict)
+        await _save_diary_entries([entry_dict])
         
         return DiaryEntryResponse(
             id=entry_dict["id"],
@@ -196,95 +507,237 @@ async def create_diary_entry(
         raise HTTPException(status_code=500, detail=f"Error creating diary entry: {str(e)}")
 
 
-@app.get("/api/diary/entries", response_model=List[DiaryEntryResponse])
-async def get_diary_entries():
-    return [
-        DiaryEntryResponse(
-            id=entry["id"],
-            text=entry["text"],
-            entry_type=entry["entry_type"],
-            timestamp=entry["timestamp"],
-            summary=None,
-            suggestions=[]
+@app.post("/api/diary/entries/batch", response_model=DiaryEntriesBatchResponse)
+async def create_diary_entries_batch(requests: List[DiaryEntryRequest]):
+    if not requests:
+        return DiaryEntriesBatchResponse(entries=[])
+    if any(not request.text for request in requests):
+        raise HTTPException(status_code=400, detail="Batch entries must provide text")
+    
+    try:
+        now = datetime.now(timezone.utc)
+        batch = []
+        for request in requests:
+            entry_timestamp = request.timestamp or now
+            if entry_timestamp.tzinfo is None:
+                entry_timestamp = entry_timestamp.replace(tzinfo=timezone.utc)
+            batch.append({
+                "id": secrets.token_hex(16),
+                "text": request.text,
+                "entry_type": request.entry_type,
+                "timestamp": entry_timestamp
+            })
+        
+        suggestions, sentiments = await asyncio.gather(
+            diary_pipeline._generate_suggestions_async(batch),
+            diary_pipeline.analyze_sentiment_async([entry["text"] for entry in batch])
         )
-        for entry in diary_entries
-    ]
+        for entry, sentiment in zip(batch, sentiments):
+            entry["sentiment"] = sentiment
+        
+        await _save_diary_entries(batch)
+        
+        # One suggestions call covers the whole batch, so it is reported once rather than per entry
+        return DiaryEntriesBatchResponse(
+            entries=[
+                DiaryEntryResponse(
+                    id=entry["id"],
+                    text=entry["text"],
+                    entry_type=entry["entry_type"],
+                    timestamp=entry["timestamp"],
+                    sentiment=entry["sentiment"],
+                    summary=None,
+                    suggestions=[]
+                )
+                for entry in batch
+            ],
+            suggestions=suggestions
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating diary entries: {str(e)}")
+
+
+@app.get("/api/diary/entries", response_model=List[DiaryEntryResponse])
+async def get_diary_entries(request: Request):
+    global _entries_cache
+    headers = {"ETag": f'"{DIARY_ETAG_PREFIX}-{diary_version}"', "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    if _entries_cache is None or _entries_cache[0] != diary_version:
+        _entries_cache = (diary_version, orjson.dumps([entry["_response"] for entry in diary_entries.values()]))
+    return Response(content=_entries_cache[1], media_type="application/json", headers=headers)
 
 
 @app.get("/api/diary/summary", response_model=DiarySummaryResponse)
 async def get_diary_summary():
+    global _summary_cache
     try:
-        summary = diary_pipeline.generate_summary(diary_entries)
-        return DiarySummaryResponse(**summary)
+        async with _summary_lock:
+            if _summary_cache is None or _summary_cache[0] != diary_version:
+                version = diary_version
+                summary = await diary_pipeline.generate_summary_async(list(diary_entries.values()))
+                body = ORJSONResponse(DiarySummaryResponse(**summary).model_dump(mode="json")).body
+                _summary_cache = (version, body)
+            return Response(content=_summary_cache[1], media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
 
-@app.delete("/api/diary/entries/{entry_id}")
-async def delete_diary_entry(entry_id: str):
-    global diary_entries
-    original_count = len(diary_entries)
-    diary_entries = [e for e in diary_entries if e["id"] != entry_id]
+async def _apply_sentiments(sentiments: Dict[str, Optional[str]]) -> int:
+    global diary_version
+    updated = []
+    for entry_id, sentiment in sentiments.items():
+        entry = diary_entries.get(entry_id)
+        if entry is None or sentiment is None:
+            continue
+        entry["sentiment"] = sentiment
+        entry["_response"]["sentiment"] = sentiment
+        updated.append(entry)
+    if updated:
+        diary_version += 1
+        await _sync_diary_redis(updated, [])
+    return len(updated)
+
+
+@app.post("/api/diary/sentiment/batch")
+async def submit_diary_sentiment_batch():
+    pending = [entry for entry in diary_entries.values() if entry.get("sentiment") is None]
+    if not pending:
+        return {"status": "completed", "scored": 0}
     
-    if len(diary_entries) == original_count:
+    try:
+        if len(pending) < SENTIMENT_BATCH_MIN_ENTRIES:
+            sentiments = await diary_pipeline.analyze_sentiment_async([entry["text"] for entry in pending])
+            scored = await _apply_sentiments({entry["id"]: sentiment for entry, sentiment in zip(pending, sentiments)})
+            return {"status": "completed", "scored": scored}
+        
+        if not azure_clients.async_openai_client:
+            raise HTTPException(status_code=503, detail="Azure OpenAI is not configured")
+        if not azure_clients.openai_batch_deployment:
+            raise HTTPException(status_code=503, detail="AZURE_OPENAI_BATCH_DEPLOYMENT is not set; sentiment batches need a GlobalBatch deployment")
+        batch_id = await diary_pipeline.submit_sentiment_batch(pending)
+        return {"status": "submitted", "batch_id": batch_id, "entries": len(pending)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error submitting sentiment batch: {str(e)}")
+
+
+@app.get("/api/diary/sentiment/batch/{batch_id}")
+async def get_diary_sentiment_batch(batch_id: str):
+    if not azure_clients.async_openai_client:
+        raise HTTPException(status_code=503, detail="Azure OpenAI is not configured")
+    
+    try:
+        status, sentiments = await diary_pipeline.poll_sentiment_batch(batch_id)
+        if sentiments is None:
+            return {"status": status}
+        return {"status": status, "scored": await _apply_sentiments(sentiments)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading sentiment batch: {str(e)}")
+
+
+@app.delete("/api/diary/entries/{entry_id}", status_code=204)
+async def delete_diary_entry(entry_id: str):
+    if not _remove_diary_entry(entry_id):
         raise HTTPException(status_code=404, detail="Entry not found")
+    await _sync_diary_redis([], [entry_id])
+    
+    return Response(status_code=204)
+
+
+def _clinical_note_response(transcription: str, soap_note_dict: Dict[str, str]) -> ORJSONResponse:
+    return ORJSONResponse({
+        "transcription": transcription,
+        "soap_note": {section: soap_note_dict[section] for section in SOAP_SECTIONS}
+    })
+
+
+def _clinical_note_stream(transcription: str, entries_list: List[Dict], gender: Optional[str]) -> StreamingResponse:
+    async def events():
+        deltas: asyncio.Queue = asyncio.Queue()
+        
+        async def on_delta(delta: str):
+            deltas.put_nowait(delta)
+        
+        task = asyncio.create_task(soap_pipeline.generate_soap_note(transcription, None, entries_list, gender, on_delta=on_delta))
+        task.add_done_callback(lambda _: deltas.put_nowait(None))
+        try:
+            yield b"data: " + orjson.dumps({"type": "transcription", "transcription": transcription}) + b"\n\n"
+            while (delta := await deltas.get()) is not None:
+                yield b"data: " + orjson.dumps({"type": "soap_delta", "delta": delta}) + b"\n\n"
+            soap_note_dict = task.result()
+        except Exception as e:
+            logger.error("Streaming SOAP generation failed: %s", e)
+            yield b"event: error\ndata: " + orjson.dumps({"type": "error", "detail": f"Error generating SOAP note: {str(e)}"}) + b"\n\n"
+            return
+        finally:
+            task.cancel()
+        yield b"data: " + orjson.dumps({
+            "type": "final",
+            "transcription": transcription,
+            "soap_note": {section: soap_note_dict[section] for section in SOAP_SECTIONS}
+        }) + b"\n\n"
     
-    return {"message": "Entry deleted successfully"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.post("/api/clinical/transcribe", response_model=ClinicalNoteResponse)
 async def transcribe_clinical_note(
-    audio_data: str = Form(...),
+    audio: UploadFile = File(None),
+    audio_data: str = Form(None),
     language: str = Form("en-US"),
     diary_entries: str = Form(None),
-    gender: str = Form(None)
+    gender: str = Form(None),
+    stream: bool = Form(False)
 ):
     try:
-        audio_bytes = decode_audio_base64(audio_data)
-        is_valid, msg = validate_audio_format(audio_bytes)
+        if audio is not None:
+            audio_bytes = await audio.read()
+        elif audio_data:
+            is_valid, msg = validate_audio_header_b64(audio_data)
+            if not is_valid:
+                raise HTTPException(status_code=400, detail=f"Invalid audio format: {msg}")
+            audio_bytes = await asyncio.to_thread(decode_audio_base64, audio_data)
+        else:
+            raise HTTPException(status_code=400, detail="Either audio or audio_data must be provided")
+        is_valid, msg = await asyncio.to_thread(validate_audio_format, audio_bytes)
         if not is_valid:
             raise HTTPException(status_code=400, detail=f"Invalid audio format: {msg}")
         
-        transcription = azure_clients.transcribe_audio(audio_bytes, language=language)
+        transcription = await azure_clients.transcribe_audio_async(audio_bytes, language=language, priority=_stt_priority(audio_bytes))
         
         entries_list = []
         if diary_entries:
             try:
-                entries_list = json.loads(diary_entries)
-                print(f"Received {len(entries_list)} diary entries for context in transcribe endpoint")
-                for entry in entries_list:
-                    print(f"  Entry: {entry.get('entry_type')} - {entry.get('text')}")
+                entries_list = orjson.loads(diary_entries)
+                logger.debug("Received %s diary entries for context in transcribe endpoint", len(entries_list))
+                if logger.isEnabledFor(logging.DEBUG):
+                    for entry in entries_list:
+                        logger.debug("  Entry: %s - %s", entry.get('entry_type'), entry.get('text'))
             except Exception as e:
-                print(f"Error parsing diary entries in transcribe: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error parsing diary entries in transcribe: %s", e)
         else:
-            print("No diary entries received in transcribe endpoint")
+            logger.debug("No diary entries received in transcribe endpoint")
         
+        if stream:
+            return _clinical_note_stream(transcription, entries_list, gender)
         soap_note_dict = await soap_pipeline.generate_soap_note(transcription, None, entries_list, gender)
-        soap_note = SOAPNote(**soap_note_dict)
-        
-        return ClinicalNoteResponse(
-            transcription=transcription,
-            soap_note=soap_note
-        )
+        return _clinical_note_response(transcription, soap_note_dict)
     except HTTPException:
         raise
+    except STTBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing clinical note: {str(e)}")
 
 
 @app.get("/test-openai")
 async def test_openai():
-    import sys
-    import logging
     from openai import AzureOpenAI
     
-    sys.stdout.flush()
-    print("\n" + "="*50, flush=True)
-    print("=== TESTING OPENAI CLIENT ===", flush=True)
-    print("="*50, flush=True)
-    sys.stdout.flush()
+    logger.debug("=== TESTING OPENAI CLIENT ===")
     
     try:
         endpoint = getattr(azure_clients, 'openai_endpoint', None)
@@ -300,12 +753,12 @@ async def test_openai():
             "api_version": api_version
         }
         
-        print(f"Endpoint: {endpoint}")
-        print(f"API Key present: {bool(api_key)}")
+        logger.debug("Endpoint: %s", endpoint)
+        logger.debug("API Key present: %s", bool(api_key))
         if api_key:
-            print(f"API Key length: {len(api_key)}")
-        print(f"Deployment: {deployment}")
-        print(f"API Version: {api_version}")
+            logger.debug("API Key length: %s", len(api_key))
+        logger.debug("Deployment: %s", deployment)
+        logger.debug("API Version: %s", api_version)
         
         if not endpoint:
             return {
@@ -321,7 +774,7 @@ async def test_openai():
                 "debug": debug_info
             }
         
-        print("Attempting direct initialization...")
+        logger.debug("Attempting direct initialization...")
         endpoint_clean = endpoint.rstrip('/')
         
         try:
@@ -330,9 +783,9 @@ async def test_openai():
                 azure_endpoint=endpoint_clean,
                 api_key=api_key
             )
-            print("Direct initialization successful!")
+            logger.debug("Direct initialization successful!")
             
-            print("Making test API call...")
+            logger.debug("Making test API call...")
             response = test_client.chat.completions.create(
                 model=deployment,
                 messages=[{"role": "user", "content": "Say hello"}],
@@ -348,10 +801,9 @@ async def test_openai():
         except Exception as init_error:
             error_msg = str(init_error)
             error_type = type(init_error).__name__
-            print(f"Initialization failed: {error_type}: {error_msg}")
+            logger.exception("Initialization failed: %s: %s", error_type, error_msg)
             import traceback
             tb = traceback.format_exc()
-            print(tb)
             
             return {
                 "status": "error",
@@ -364,8 +816,8 @@ async def test_openai():
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
-        print(f"ERROR in test_openai: {error_detail}")
-        return JSONResponse(
+        logger.error("ERROR in test_openai: %s", error_detail)
+        return ORJSONResponse(
             status_code=500,
             content={
                 "status": "error",
@@ -376,51 +828,49 @@ async def test_openai():
 
 
 @app.post("/api/clinical/text-to-soap", response_model=ClinicalNoteResponse)
-async def text_to_soap(text: str = Form(...), diary_entries: str = Form(None), gender: str = Form(None)):
+async def text_to_soap(text: str = Form(...), diary_entries: str = Form(None), gender: str = Form(None), stream: bool = Form(False)):
     try:
-        print(f"\n=== SOAP Generation Request ===")
-        print(f"OpenAI client check: {azure_clients.openai_client is not None}")
-        if not azure_clients.openai_client:
-            print("WARNING: OpenAI client is None - will use fallback")
-            print(f"Endpoint: {azure_clients.openai_endpoint}")
-            print(f"API Key set: {bool(azure_clients.openai_api_key)}")
-            print(f"Deployment: {azure_clients.openai_deployment}")
-            print(f"API Version: {azure_clients.openai_api_version}")
+        logger.debug("=== SOAP Generation Request ===")
+        if not azure_clients.async_openai_client:
+            logger.warning("OpenAI client is None - will use fallback")
+            logger.debug("Endpoint: %s", azure_clients.openai_endpoint)
+            logger.debug("API Key set: %s", bool(azure_clients.openai_api_key))
+            logger.debug("Deployment: %s", azure_clients.openai_deployment)
+            logger.debug("API Version: %s", azure_clients.openai_api_version)
         
         entries_list = []
         if diary_entries:
             try:
-                entries_list = json.loads(diary_entries)
-                print(f"Received {len(entries_list)} diary entries for context")
-                for entry in entries_list:
-                    print(f"  Entry: {entry.get('entry_type')} - {entry.get('text')}")
+                entries_list = orjson.loads(diary_entries)
+                logger.debug("Received %s diary entries for context", len(entries_list))
+                if logger.isEnabledFor(logging.DEBUG):
+                    for entry in entries_list:
+                        logger.debug("  Entry: %s - %s", entry.get('entry_type'), entry.get('text'))
             except Exception as e:
-                print(f"Error parsing diary entries: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("Error parsing diary entries: %s", e)
         else:
-            print("No diary entries received")
+            logger.debug("No diary entries received")
         
+        if stream:
+            return _clinical_note_stream(text, entries_list, gender)
         soap_note_dict = await soap_pipeline.generate_soap_note(text, None, entries_list, gender)
-        soap_note = SOAPNote(**soap_note_dict)
-        
-        return ClinicalNoteResponse(
-            transcription=text,
-            soap_note=soap_note
-        )
+        return _clinical_note_response(text, soap_note_dict)
     except Exception as e:
-        print(f"ERROR in text_to_soap: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERROR in text_to_soap: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generating SOAP note: {str(e)}")
 
 
+def _send_json(websocket: WebSocket, payload: Dict[str, Any]):
+    return websocket.send_text(orjson.dumps(payload).decode())
+
+
 @app.websocket("/ws/clinical/stream")
 async def websocket_clinical_stream(websocket: WebSocket):
     await websocket.accept()
     
     recognizer = None
     push_stream = None
+    stt_slot = None
     current_transcript = ""
     current_soap = {
         "subjective": "",
@@ -430,99 +880,132 @@ async def websocket_clinical_stream(websocket: WebSocket):
     }
     diary_entries = []
     update_buffer = []
+    final_event = asyncio.Event()
+    outbox = asyncio.Queue()
+    outbox_closed = object()
+    pending_interim = None
     loop = asyncio.get_event_loop()
     
+    def queue_event(payload):
+        nonlocal pending_interim
+        if payload["type"] == "transcription":
+            pending_interim = None
+        outbox.put_nowait(payload)
+    
+    def queue_interim(text):
+        nonlocal pending_interim
+        if pending_interim is None:
+            outbox.put_nowait(None)
+        pending_interim = text
+    
+    async def send_events():
+        # The only coroutine that writes to the socket; everything else goes through outbox
+        nonlocal pending_interim
+        while True:
+            payload = await outbox.get()
+            if payload is outbox_closed:
+                return
+            if payload is None:
+                if pending_interim is None:
+                    continue
+                payload = {"type": "transcription", "status": "interim", "text": pending_interim}
+                pending_interim = None
+            await _send_json(websocket, payload)
+    
+    def record_final(text):
+        nonlocal current_transcript
+        current_transcript += " " + text if current_transcript else text
+        current_transcript = current_transcript.strip()
+        update_buffer.append(("final", text))
+        final_event.set()
+        queue_event({
+            "type": "transcription",
+            "status": "final",
+            "text": text,
+            "full_transcript": current_transcript
+        })
+    
     def speech_callback(result_type, text):
-        nonlocal current_transcript, update_buffer
-        
+        # Runs on the Speech SDK thread; all session state is mutated on the event loop
         if result_type == "final":
-            current_transcript += " " + text if current_transcript else text
-            current_transcript = current_transcript.strip()
-            update_buffer.append(("final", text))
-            
-            loop.call_soon_threadsafe(
-                lambda: asyncio.create_task(websocket.send_json({
-                    "type": "transcription",
-                    "status": "final",
-                    "text": text,
-                    "full_transcript": current_transcript
-                }))
-            )
+            loop.call_soon_threadsafe(record_final, text)
         elif result_type == "interim":
-            loop.call_soon_threadsafe(
-                lambda: asyncio.create_task(websocket.send_json({
-                    "type": "transcription",
-                    "status": "interim",
-                    "text": text
-                }))
-            )
+            loop.call_soon_threadsafe(queue_interim, text)
         elif result_type == "error":
-            loop.call_soon_threadsafe(
-                lambda: asyncio.create_task(websocket.send_json({
-                    "type": "error",
-                    "message": text
-                }))
-            )
+            loop.call_soon_threadsafe(queue_event, {
+                "type": "error",
+                "message": text
+            })
+    
+    sender_task = asyncio.create_task(send_events())
     
     try:
-        init_data = await websocket.receive_json()
+        init_data = orjson.loads(await websocket.receive_text())
         gender = None
         if init_data.get("type") == "init":
             if init_data.get("diary_entries"):
                 try:
-                    diary_entries = json.loads(init_data["diary_entries"])
+                    diary_entries = orjson.loads(init_data["diary_entries"])
                 except:
                     pass
             gender = init_data.get("gender")
             
-            recognizer, push_stream = azure_clients.start_continuous_recognition(
+            stt_slot = await azure_clients.stt_scheduler.acquire("streaming")
+            recognizer, push_stream = await azure_clients.run_blocking(
+                azure_clients.start_continuous_recognition,
                 speech_callback,
                 language=init_data.get("language", "en-US")
             )
             
-            await websocket.send_json({"type": "ready"})
+            queue_event({"type": "ready"})
         
         async def process_soap_updates():
             nonlocal current_soap, update_buffer, current_transcript
-            first_update = True
+            pending_chunks = []
+            last_update = time.monotonic()
             
             while True:
-                if first_update:
-                    await asyncio.sleep(3.0)
-                    first_update = False
-                else:
-                    await asyncio.sleep(2.5)
+                try:
+                    await asyncio.wait_for(final_event.wait(), timeout=SOAP_UPDATE_MAX_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                final_event.clear()
+                
+                if update_buffer:
+                    pending_chunks.extend(text for status, text in update_buffer if status == "final")
+                    update_buffer = []
+                new_text = " ".join(pending_chunks)
+                if not new_text:
+                    continue
+                if len(new_text) < SOAP_UPDATE_MIN_CHARS and time.monotonic() - last_update < SOAP_UPDATE_MAX_INTERVAL:
+                    continue
                 
                 if current_transcript and len(current_transcript.strip()) > 10:
+                    pending_chunks = []
+                    last_update = time.monotonic()
                     try:
-                        new_text = ""
-                        if update_buffer:
-                            final_chunks = [text for status, text in update_buffer if status == "final"]
-                            update_buffer = []
-                            new_text = " ".join(final_chunks)
-                        
                         updated_soap = await soap_pipeline.update_soap_incremental(
-                            new_text if new_text else current_transcript,
+                            new_text,
                             current_soap,
                             current_transcript,
                             diary_entries,
                             gender
                         )
                         
-                        changed_sections = []
-                        for section in ["subjective", "objective", "assessment", "plan"]:
-                            if updated_soap.get(section) != current_soap.get(section):
-                                changed_sections.append(section)
+                        changed_sections = [
+                            section for section in SOAP_SECTIONS
+                            if updated_soap.get(section) != current_soap.get(section)
+                        ]
                         
                         current_soap = updated_soap
                         
-                        await websocket.send_json({
+                        queue_event({
                             "type": "soap_update",
                             "soap": updated_soap,
                             "changed_sections": changed_sections
                         })
                     except Exception as e:
-                        print(f"Error updating SOAP: {e}")
+                        logger.error("Error updating SOAP: %s", e)
         
         update_task = asyncio.create_task(process_soap_updates())
         running = True
@@ -531,12 +1014,12 @@ async def websocket_clinical_stream(websocket: WebSocket):
             try:
                 data = await websocket.receive()
                 
-                if "bytes" in data:
-                    audio_chunk = data["bytes"]
+                audio_chunk = data.get("bytes")
+                if audio_chunk is not None:
                     if push_stream:
-                        push_stream.write(audio_chunk.tobytes() if hasattr(audio_chunk, 'tobytes') else bytes(audio_chunk))
+                        push_stream.write(audio_chunk)
                 elif "text" in data:
-                    message = json.loads(data["text"])
+                    message = orjson.loads(data["text"])
                     if message.get("type") == "stop":
                         running = False
                         break
@@ -544,11 +1027,11 @@ async def websocket_clinical_stream(websocket: WebSocket):
                 running = False
                 break
             except Exception as e:
-                print(f"WebSocket error: {e}")
+                logger.error("WebSocket error: %s", e)
                 running = False
                 break
         
-        print("Stop signal received, preparing for final SOAP generation...")
+        logger.debug("Stop signal received, preparing for final SOAP generation...")
         
         update_task.cancel()
         try:
@@ -556,26 +1039,26 @@ async def websocket_clinical_stream(websocket: WebSocket):
         except asyncio.CancelledError:
             pass
         
-        print("Waiting for speech recognition to finalize...")
+        logger.debug("Waiting for speech recognition to finalize...")
         await asyncio.sleep(1.5)
         
         if recognizer:
             try:
-                print("Stopping continuous recognition...")
-                recognizer.stop_continuous_recognition_async().get()
-                print("Recognition stopped")
+                logger.debug("Stopping continuous recognition...")
+                await azure_clients.run_blocking(lambda: recognizer.stop_continuous_recognition_async().get())
+                logger.debug("Recognition stopped")
             except Exception as e:
-                print(f"Error stopping recognizer: {e}")
+                logger.error("Error stopping recognizer: %s", e)
         
         await asyncio.sleep(1.0)
         
         if push_stream:
             try:
-                print("Closing audio stream...")
-                push_stream.close()
-                print("Audio stream closed")
+                logger.debug("Closing audio stream...")
+                await azure_clients.run_blocking(push_stream.close)
+                logger.debug("Audio stream closed")
             except Exception as e:
-                print(f"Error closing stream: {e}")
+                logger.error("Error closing stream: %s", e)
         
         await asyncio.sleep(0.5)
         
@@ -583,65 +1066,168 @@ async def websocket_clinical_stream(websocket: WebSocket):
             if not current_transcript or current_transcript.strip() == "":
                 current_transcript = "No speech detected."
             
-            print(f"=== FINAL SOAP GENERATION ===")
-            print(f"Transcript length: {len(current_transcript)}")
-            print(f"Transcript: {current_transcript}")
-            print(f"Current incremental SOAP state: {current_soap}")
-            print(f"Diary entries: {len(diary_entries)}")
+            logger.debug("=== FINAL SOAP GENERATION ===")
+            logger.debug("Transcript length: %s", len(current_transcript))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Transcript: %s", current_transcript)
+                logger.debug("Current incremental SOAP state: %s", current_soap)
+            logger.debug("Diary entries: %s", len(diary_entries))
             
-            final_soap = await soap_pipeline.generate_soap_note(current_transcript, None, diary_entries, gender)
+            async def queue_delta(delta: str):
+                queue_event({"type": "soap_delta", "delta": delta})
             
-            print(f"=== FINAL SOAP GENERATED ===")
-            print(f"Subjective: {final_soap.get('subjective', '')[:100]}...")
-            print(f"Assessment: {final_soap.get('assessment', '')[:100]}...")
-            print(f"Plan: {final_soap.get('plan', '')[:100]}...")
+            final_soap = await soap_pipeline.generate_soap_note(
+                current_transcript, None, diary_entries, gender,
+                on_delta=queue_delta
+            )
+            
+            logger.debug("=== FINAL SOAP GENERATED ===")
+            logger.debug("Subjective: %s...", final_soap.get('subjective', '')[:100])
+            logger.debug("Assessment: %s...", final_soap.get('assessment', '')[:100])
+            logger.debug("Plan: %s...", final_soap.get('plan', '')[:100])
             
-            await websocket.send_json({
+            queue_event({
                 "type": "final",
                 "transcription": current_transcript,
                 "soap": final_soap
             })
-            print(f"Final SOAP note sent to client. Transcript length: {len(current_transcript)}")
+            logger.debug("Final SOAP note queued for client. Transcript length: %s", len(current_transcript))
         except Exception as e:
-            print(f"ERROR generating final SOAP: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("ERROR generating final SOAP: %s", e)
             try:
-                print("Attempting fallback: generating fresh SOAP from transcript...")
+                logger.debug("Attempting fallback: generating fresh SOAP from transcript...")
                 final_soap = await soap_pipeline.generate_soap_note(current_transcript or "No transcript available", None, diary_entries)
-                await websocket.send_json({
+                queue_event({
                     "type": "final",
                     "transcription": current_transcript or "Error occurred",
                     "soap": final_soap
                 })
-                print("Fallback SOAP sent successfully")
+                logger.debug("Fallback SOAP queued successfully")
             except Exception as e2:
-                print(f"ERROR in fallback: {e2}")
-                try:
-                    await websocket.send_json({
-                        "type": "final",
-                        "transcription": current_transcript or "Error occurred",
-                        "soap": current_soap
-                    })
-                except:
-                    pass
+                logger.error("ERROR in fallback: %s", e2)
+                queue_event({
+                    "type": "final",
+                    "transcription": current_transcript or "Error occurred",
+                    "soap": current_soap
+                })
         
     except Exception as e:
-        print(f"WebSocket stream error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("WebSocket stream error: %s", e)
+        queue_event({"type": "error", "message": str(e)})
+    finally:
+        if stt_slot is not None:
+            stt_slot.release()
+        outbox.put_nowait(outbox_closed)
         try:
-            await websocket.send_json({"type": "error", "message": str(e)})
-        except:
+            # Flush queued events before closing; wait_for cancels the sender on timeout
+            await asyncio.wait_for(sender_task, timeout=WS_FLUSH_SECONDS)
+        except Exception:
             pass
-    finally:
         try:
             await websocket.close()
         except:
             pass
 
+async def fetch_npi(params: Dict[str, Any]) -> Dict[str, Any]:
+    key = tuple(sorted((name, str(value).strip().lower()) for name, value in params.items()))
+    cached = _npi_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        _npi_cache.move_to_end(key)
+        return cached[1]
+    
+    # A waiter whose owner was cancelled takes over the fetch instead of failing with it
+    while (inflight := _npi_inflight.get(key)) is not None:
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+    
+    future = asyncio.get_running_loop().create_future()
+    _npi_inflight[key] = future
+    try:
+        data = None
+        redis_key = "npi:" + hashlib.sha1(orjson.dumps(key)).hexdigest()
+        if _redis is not None:
+            try:
+                cached_raw = await _redis.get(redis_key)
+                if cached_raw is not None:
+                    data = orjson.loads(cached_raw)
+            except Exception as e:
+                logger.warning("[DOCTORS] Redis NPI cache read failed: %s", e)
+        
+        if data is None:
+            response = await azure_clients.async_http_client.get(NPI_API_URL, params=params, timeout=10.0)
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            if _redis is not None:
+                try:
+                    await _redis.setex(redis_key, int(NPI_CACHE_TTL), response.content)
+                except Exception as e:
+                    logger.warning("[DOCTORS] Redis NPI cache write failed: %s", e)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        _npi_inflight.pop(key, None)
+    
+    future.set_result(data)
+    _npi_cache[key] = (time.monotonic() + NPI_CACHE_TTL, data)
+    _npi_cache.move_to_end(key)
+    if len(_npi_cache) > NPI_CACHE_SIZE:
+        _npi_cache.popitem(last=False)
+    return data
+
+
+def _parse_provider(result: Dict[str, Any], default_specialty: str) -> Optional[Dict[str, Any]]:
+    provider = result.get("basic", {})
+    addresses = result.get("addresses", [])
+    taxonomies = result.get("taxonomies", [])
+    
+    primary_address = addresses[0] if addresses else {}
+    primary_taxonomy = taxonomies[0] if taxonomies else {}
+    
+    organization_name = provider.get("organization_name", "")
+    doctor_name = organization_name or f"{provider.get('first_name', '')} {provider.get('last_name', '')}".strip()
+    if not doctor_name:
+        return None
+    
+    full_address = ", ".join(part for key in ADDRESS_KEYS if (part := primary_address.get(key)))
+    
+    return {
+        "name": doctor_name,
+        "specialty": primary_taxonomy.get("desc", default_specialty),
+        "clinic": organization_name,
+        "address": full_address or "Address not available",
+        "phone": primary_address.get("telephone_number", "Phone not available"),
+        "npi": result.get("number", "")
+    }
+
+
+def _parse_providers(results: List[Dict[str, Any]], default_specialty: str) -> List[Dict[str, Any]]:
+    providers = {}
+    for result in results:
+        provider = _parse_provider(result, default_specialty)
+        if provider is not None:
+            providers.setdefault(provider["npi"] or id(provider), provider)
+    return list(providers.values())
+
+
+def _etag_response(request: Request, payload: Any, cache_control: str) -> Response:
+    body = orjson.dumps(payload)
+    headers = {"ETag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"', "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/api/doctors")
 async def get_doctors(
+    request: Request,
     specialty: str = None,
     assessment: str = None,
     transcription: str = None,
@@ -649,23 +1235,26 @@ async def get_doctors(
     state: str = None
 ):
     try:
-        import httpx
-        
-        default_state = os.getenv("NPI_DEFAULT_STATE", "NY")
-        default_city = os.getenv("NPI_DEFAULT_CITY", "")
-        search_limit = int(os.getenv("NPI_SEARCH_LIMIT", "10"))
+        settings = get_settings()
+        default_state = settings.npi_default_state
+        default_city = settings.npi_default_city
+        search_limit = settings.npi_search_limit
         
         search_state = state or default_state
         search_city = city or default_city
         
         combined_text = f"{(assessment or '')} {(transcription or '')}".strip()
-        print(f"[DOCTORS] Combined text: {combined_text[:200]}...")
-        print(f"[DOCTORS] Assessment: {assessment}")
-        print(f"[DOCTORS] Transcription: {transcription}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DOCTORS] Combined text: %s...", combined_text[:200])
+            logger.debug("[DOCTORS] Assessment: %s", assessment)
+            logger.debug("[DOCTORS] Transcription: %s", transcription)
         
-        taxonomy_description = None
+        specialty_key = hashlib.blake2b(" ".join(combined_text.lower().split()).encode(), digest_size=16).digest()
+        taxonomy_description = _specialty_cache.get(specialty_key)
+        if taxonomy_description is not None:
+            _specialty_cache.move_to_end(specialty_key)
         
-        if azure_clients.openai_client and combined_text:
+        if taxonomy_description is None and azure_clients.async_openai_client and combined_text:
             try:
                 ai_prompt = f"""Based on the following patient symptoms and assessment, determine the most appropriate medical specialty needed. 
 
@@ -692,7 +1281,7 @@ If the symptoms suggest multiple specialties, choose the PRIMARY specialty that
 
 Respond with ONLY the specialty name, nothing else."""
 
-                response = azure_clients.openai_client.chat.completions.create(
+                response = await azure_clients.async_openai_client.chat.completions.create(
                     model=azure_clients.openai_deployment,
                     messages=[
                         {"role": "system", "content": "You are a medical specialty advisor. Analyze symptoms and recommend the most appropriate medical specialty."},
@@ -703,55 +1292,24 @@ Respond with ONLY the specialty name, nothing else."""
                 )
                 
                 taxonomy_description = response.choices[0].message.content.strip()
-                print(f"AI recommended specialty: {taxonomy_description}")
-                
-                taxonomy_map = {
-                    "family medicine": "Family Medicine",
-                    "internal medicine": "Internal Medicine",
-                    "cardiology": "Cardiology",
-                    "endocrinology": "Endocrinology",
-                    "neurology": "Neurology",
-                    "orthopedic": "Orthopedic Surgery",
-                    "orthopedics": "Orthopedic Surgery",
-                    "dermatology": "Dermatology",
-                    "gastroenterology": "Gastroenterology",
-                    "pulmonology": "Pulmonology",
-                    "rheumatology": "Rheumatology",
-                    "psychiatry": "Psychiatry",
-                    "pediatrics": "Pediatrics",
-                    "obstetrics": "Obstetrics & Gynecology",
-                    "gynecology": "Obstetrics & Gynecology",
-                    "emergency": "Emergency Medicine"
-                }
+                logger.debug("AI recommended specialty: %s", taxonomy_description)
                 
                 taxonomy_lower = taxonomy_description.lower()
-                for key, value in taxonomy_map.items():
-                    if key in taxonomy_lower:
-                        taxonomy_description = value
-                        break
+                taxonomy_description = EXACT_TAXONOMIES.get(taxonomy_lower) or next(
+                    (value for key, value in TAXONOMY_MAP.items() if key in taxonomy_lower),
+                    taxonomy_description
+                )
                 
+                _specialty_cache[specialty_key] = taxonomy_description
+                if len(_specialty_cache) > SPECIALTY_CACHE_SIZE:
+                    _specialty_cache.popitem(last=False)
             except Exception as e:
-                print(f"Error getting AI specialty recommendation: {e}")
+                logger.error("Error getting AI specialty recommendation: %s", e)
                 taxonomy_description = None
         
         if not taxonomy_description:
-            combined_text_lower = combined_text.lower()
-            if any(keyword in combined_text_lower for keyword in ["heart", "cardiac", "chest", "hypertension", "blood pressure", "arrhythmia"]):
-                taxonomy_description = "Cardiology"
-            elif any(keyword in combined_text_lower for keyword in ["diabetes", "thyroid", "hormone", "metabolic", "insulin", "glucose"]):
-                taxonomy_description = "Endocrinology"
-            elif any(keyword in combined_text_lower for keyword in ["headache", "migraine", "neurological", "brain", "nerve", "seizure", "stroke"]):
-                taxonomy_description = "Neurology"
-            elif any(keyword in combined_text_lower for keyword in ["bone", "joint", "knee", "hip", "fracture", "arthritis"]):
-                taxonomy_description = "Orthopedic Surgery"
-            elif any(keyword in combined_text_lower for keyword in ["skin", "rash", "dermatitis", "acne"]):
-                taxonomy_description = "Dermatology"
-            elif any(keyword in combined_text_lower for keyword in ["stomach", "digestive", "gastro", "nausea", "vomit"]):
-                taxonomy_description = "Gastroenterology"
-            elif any(keyword in combined_text_lower for keyword in ["lung", "breathing", "asthma", "cough", "respiratory"]):
-                taxonomy_description = "Pulmonology"
-            else:
-                taxonomy_description = "Family Medicine"
+            matched = [SPECIALTY_ORDER[m.lastgroup] for m in SPECIALTY_PATTERN.finditer(combined_text)]
+            taxonomy_description = SPECIALTY_KEYWORDS[min(matched)][0] if matched else "Family Medicine"
         
         params = {
             "version": "2.1",
@@ -767,198 +1325,101 @@ Respond with ONLY the specialty name, nothing else."""
         if search_city:
             params["city"] = search_city
         
-        npi_url = "https://npiregistry.cms.hhs.gov/api/"
-        print(f"[DOCTORS] NPI API params: {params}")
-        print(f"[DOCTORS] Using specialty: {taxonomy_description}")
+        logger.debug("[DOCTORS] NPI API params: %s", params)
+        logger.debug("[DOCTORS] Using specialty: %s", taxonomy_description)
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(npi_url, params=params)
-            response.raise_for_status()
-            npi_data = response.json()
+        fallback_task = None
+        if taxonomy_description != "Family Medicine":
+            fallback_task = asyncio.create_task(fetch_npi({**params, "taxonomy_description": "Family Medicine"}))
+            fallback_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        
+        npi_data = await fetch_npi(params)
         
-        print(f"[DOCTORS] NPI API response - result_count: {npi_data.get('result_count', 0)}")
+        logger.debug("[DOCTORS] NPI API response - result_count: %s", npi_data.get('result_count', 0))
         
         doctors = []
         if npi_data.get("result_count", 0) > 0:
-            all_providers = []
-            for result in npi_data.get("results", []):
-                provider = result.get("basic", {})
-                addresses = result.get("addresses", [])
-                taxonomies = result.get("taxonomies", [])
-                
-                primary_address = addresses[0] if addresses else {}
-                primary_taxonomy = taxonomies[0] if taxonomies else {}
-                
-                doctor_name = ""
-                if provider.get("organization_name"):
-                    doctor_name = provider["organization_name"]
-                else:
-                    first_name = provider.get("first_name", "")
-                    last_name = provider.get("last_name", "")
-                    doctor_name = f"{first_name} {last_name}".strip()
-                
-                if not doctor_name:
-                    continue
-                
-                address_parts = [
-                    primary_address.get("address_1", ""),
-                    primary_address.get("address_2", ""),
-                    primary_address.get("city", ""),
-                    primary_address.get("state", ""),
-                    primary_address.get("postal_code", "")
-                ]
-                full_address = ", ".join([p for p in address_parts if p])
-                
-                phone = primary_address.get("telephone_number", "Phone not available")
-                specialty_name = primary_taxonomy.get("desc", taxonomy_description or "General Practice")
-                
-                all_providers.append({
-                    "name": doctor_name,
-                    "specialty": specialty_name,
-                    "clinic": provider.get("organization_name", ""),
-                    "address": full_address or "Address not available",
-                    "phone": phone,
-                    "npi": result.get("number", ""),
-                    "raw_data": combined_text
-                })
+            all_providers = _parse_providers(npi_data.get("results", []), taxonomy_description or "General Practice")
             
-            if azure_clients.openai_client and combined_text and len(all_providers) > 0:
+            if azure_clients.async_openai_client and combined_text and len(all_providers) > search_limit:
                 try:
                     providers_text = "\n".join([
-                        f"{i+1}. {p['name']} - {p['specialty']} - {p['address']}"
+                        f"{i+1}. {p['name']} - {p['specialty']}"
                         for i, p in enumerate(all_providers[:20])
                     ])
                     
                     ranking_prompt = f"""Based on the patient's symptoms and assessment, rank these doctors from most to least appropriate:
 
 Patient Symptoms/Assessment:
-{combined_text}
+{combined_text[:RANKING_CONTEXT_CHARS]}
 
 Available Doctors:
 {providers_text}
 
-Respond with ONLY a comma-separated list of numbers (e.g., "3,1,5,2,4") representing the ranking order, where 1 is the first doctor listed, 2 is the second, etc. Return the top {search_limit} most appropriate doctors."""
+Respond with ONLY a JSON object of the form {{"ranking": [3, 1, 5, 2, 4]}} giving the ranking order, where 1 is the first doctor listed, 2 is the second, etc. Return the top {search_limit} most appropriate doctors."""
 
-                    response = azure_clients.openai_client.chat.completions.create(
+                    response = await azure_clients.async_openai_client.chat.completions.create(
                         model=azure_clients.openai_deployment,
                         messages=[
                             {"role": "system", "content": "You are a medical referral advisor. Rank doctors by how well they match the patient's needs."},
                             {"role": "user", "content": ranking_prompt}
                         ],
                         temperature=0.3,
-                        max_tokens=100
+                        max_tokens=100,
+                        response_format={"type": "json_object"}
                     )
                     
-                    ranking_text = response.choices[0].message.content.strip()
-                    ranked_indices = []
-                    for num in ranking_text.split(","):
-                        try:
-                            idx = int(num.strip()) - 1
-                            if 0 <= idx < len(all_providers):
-                                ranked_indices.append(idx)
-                        except:
-                            pass
+                    ranking = orjson.loads(response.choices[0].message.content).get("ranking", [])
+                    listed = min(len(all_providers), 20)
+                    ranked_indices = list(dict.fromkeys(
+                        num - 1 for num in ranking if isinstance(num, int) and 0 < num <= listed
+                    ))
                     
                     if ranked_indices:
                         doctors = [all_providers[i] for i in ranked_indices if i < len(all_providers)][:search_limit]
-                        remaining = [all_providers[i] for i in range(len(all_providers)) if i not in ranked_indices]
+                        ranked_set = set(ranked_indices)
+                        remaining = [p for i, p in enumerate(all_providers) if i not in ranked_set]
                         doctors.extend(remaining[:search_limit - len(doctors)])
                     else:
                         doctors = all_providers[:search_limit]
                     
-                    print(f"AI ranked {len(doctors)} doctors")
+                    logger.debug("AI ranked %s doctors", len(doctors))
                 except Exception as e:
-                    print(f"Error ranking doctors with AI: {e}")
+                    logger.error("Error ranking doctors with AI: %s", e)
                     doctors = all_providers[:search_limit]
             else:
                 doctors = all_providers[:search_limit]
-            
-            for doctor in doctors:
-                doctor.pop("raw_data", None)
         
-        print(f"[DOCTORS] Returning {len(doctors)} doctors")
+        logger.debug("[DOCTORS] Returning %s doctors", len(doctors))
         
-        if not doctors and taxonomy_description and taxonomy_description != "Family Medicine":
-            print(f"[DOCTORS] No doctors found for {taxonomy_description}, trying Family Medicine fallback...")
-            fallback_params = {
-                "version": "2.1",
-                "limit": min(search_limit * 2, 50),
-                "taxonomy_description": "Family Medicine"
-            }
-            if search_state:
-                fallback_params["state"] = search_state
-            if search_city:
-                fallback_params["city"] = search_city
-            
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                fallback_response = await client.get(npi_url, params=fallback_params)
-                fallback_response.raise_for_status()
-                fallback_data = fallback_response.json()
+        if not doctors and fallback_task is not None:
+            logger.debug("[DOCTORS] No doctors found for %s, trying Family Medicine fallback...", taxonomy_description)
+            fallback_data = await fallback_task
             
             if fallback_data.get("result_count", 0) > 0:
-                for result in fallback_data.get("results", [])[:search_limit]:
-                    provider = result.get("basic", {})
-                    addresses = result.get("addresses", [])
-                    taxonomies = result.get("taxonomies", [])
-                    
-                    primary_address = addresses[0] if addresses else {}
-                    primary_taxonomy = taxonomies[0] if taxonomies else {}
-                    
-                    doctor_name = ""
-                    if provider.get("organization_name"):
-                        doctor_name = provider["organization_name"]
-                    else:
-                        first_name = provider.get("first_name", "")
-                        last_name = provider.get("last_name", "")
-                        doctor_name = f"{first_name} {last_name}".strip()
-                    
-                    if not doctor_name:
-                        continue
-                    
-                    address_parts = [
-                        primary_address.get("address_1", ""),
-                        primary_address.get("address_2", ""),
-                        primary_address.get("city", ""),
-                        primary_address.get("state", ""),
-                        primary_address.get("postal_code", "")
-                    ]
-                    full_address = ", ".join([p for p in address_parts if p])
-                    
-                    phone = primary_address.get("telephone_number", "Phone not available")
-                    specialty_name = primary_taxonomy.get("desc", "Family Medicine")
-                    
-                    doctors.append({
-                        "name": doctor_name,
-                        "specialty": specialty_name,
-                        "clinic": provider.get("organization_name", ""),
-                        "address": full_address or "Address not available",
-                        "phone": phone,
-                        "npi": result.get("number", "")
-                    })
+                doctors = _parse_providers(fallback_data.get("results", [])[:search_limit], "Family Medicine")
             
-            print(f"[DOCTORS] Fallback returned {len(doctors)} doctors")
+            logger.debug("[DOCTORS] Fallback returned %s doctors", len(doctors))
         
         if not doctors:
-            print(f"[DOCTORS] No doctors found - result_count was {npi_data.get('result_count', 0)}")
+            logger.debug("[DOCTORS] No doctors found - result_count was %s", npi_data.get('result_count', 0))
             return {
                 "doctors": [],
                 "message": "No doctors found in NPI Registry"
             }
         
-        return {
+        return _etag_response(request, {
             "doctors": doctors,
             "total": len(doctors)
-        }
+        }, f"private, max-age={DOCTORS_MAX_AGE}")
     except httpx.HTTPError as e:
-        print(f"HTTP error calling NPI Registry: {e}")
+        logger.error("HTTP error calling NPI Registry: %s", e)
         return {
             "doctors": [],
             "message": f"Error connecting to NPI Registry: {str(e)}"
         }
     except Exception as e:
-        print(f"Error loading doctors from NPI Registry: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error loading doctors from NPI Registry: %s", e)
         return {
             "doctors": [],
             "message": f"Error loading doctors: {str(e)}"
@@ -969,4 +1430,13 @@ Respond with ONLY a comma-separated list of numbers (e.g., "3,1,5,2,4") represen
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        f"{__spec__.name}:app" if __spec__ else app,
+        host="0.0.0.0",
+        port=8000,
+        workers=get_settings().uvicorn_workers,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        log_level=get_settings().log_level.lower()
+    )
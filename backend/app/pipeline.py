@@ -1,16 +1,135 @@
-from typing import Dict, List, Any, Optional
-from datetime import datetime, timedelta
-import httpx
+from typing import Awaitable, Callable, Dict, List, Any, Optional, Tuple
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
+import re
+import threading
+import time
 import asyncio
-from .azure_clients import AzureClients
+import orjson
+from .azure_clients import AzureClients, SENTIMENT_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+SUGGESTIONS_CACHE_SIZE = 1024
+SUGGESTIONS_CACHE_TTL = 3600
+SOAP_CACHE_SIZE = 256
+SOAP_CACHE_TTL = 3600
+SENTIMENT_CONCURRENCY = 10
+SENTIMENT_CACHE_SIZE = 4096
+SENTIMENT_BATCH_MIN_ENTRIES = 20
+SENTIMENT_LABELS = ("positive", "negative", "neutral", "mixed")
+COMMON_DISEASES = ("diabetes", "hypertension", "asthma", "arthritis", "heart disease", "cancer", "thyroid", "copd", "depression", "anxiety")
+_DISEASE_PATTERN = re.compile("|".join(map(re.escape, COMMON_DISEASES)))
+_POSITIVE_MOOD_PATTERN = re.compile("happy|good", re.IGNORECASE)
+_NEGATIVE_MOOD_PATTERN = re.compile("sad|bad", re.IGNORECASE)
+SOAP_SECTION_MARKERS = {
+    "subjective": ("===subjective===", "subjective:", "**subjective**", "subjective (s):", "s:"),
+    "objective": ("===objective===", "objective:", "**objective**", "objective (o):", "o:"),
+    "assessment": ("===assessment===", "assessment:", "**assessment**", "assessment (a):", "a:", "impression:", "diagnosis:"),
+    "plan": ("===plan===", "plan:", "**plan**", "plan (p):", "p:", "treatment plan:")
+}
+SOAP_HEADER_INSTRUCTION = "Format your response EXACTLY as follows with clear section headers:\n\n===SUBJECTIVE===\n[Content here]\n\n===OBJECTIVE===\n[Content here]\n\n===ASSESSMENT===\n[Content here]\n\n===PLAN===\n[Content here]"
+SOAP_JSON_INSTRUCTION = "Respond with a single JSON object with exactly the string keys \"subjective\", \"objective\", \"assessment\" and \"plan\". Each value is the full text of that section. Do not write section headers; separate lines or numbered items within a value with \\n."
+_SOAP_HEADER_RE = re.compile(
+    "|".join(f"(?P<{section}>{'|'.join(map(re.escape, markers))})" for section, markers in SOAP_SECTION_MARKERS.items()),
+    re.IGNORECASE
+)
 
 
 class DiaryPipeline:
     
     def __init__(self, azure_clients: AzureClients):
         self.azure_clients = azure_clients
+        self._suggestions_cache = OrderedDict()
+        self._suggestions_cache_lock = threading.Lock()
+        self._sentiment_cache: "OrderedDict[bytes, str]" = OrderedDict()
+    
+    async def generate_summary_async(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not entries:
+            return self._build_summary(entries, [])
+        return self._build_summary(entries, await self._generate_suggestions_async(entries))
+    
+    async def analyze_sentiment_async(self, texts: List[str]) -> List[Optional[str]]:
+        if not texts:
+            return []
+        
+        keys = [hashlib.blake2b(" ".join(text.lower().split()).encode(), digest_size=16).digest() for text in texts]
+        results = [self._sentiment_cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if not misses or not self.azure_clients.text_analytics_client:
+            return results
+        
+        scored = await self._score_sentiments([texts[i] for i in misses])
+        for i, sentiment in zip(misses, scored):
+            results[i] = sentiment
+            if sentiment is not None:
+                self._sentiment_cache[keys[i]] = sentiment
+                self._sentiment_cache.move_to_end(keys[i])
+        while len(self._sentiment_cache) > SENTIMENT_CACHE_SIZE:
+            self._sentiment_cache.popitem(last=False)
+        return results
+    
+    async def _score_sentiments(self, texts: List[str]) -> List[Optional[str]]:
+        semaphore = asyncio.Semaphore(SENTIMENT_CONCURRENCY)
+        
+        async def score(chunk: List[str]) -> List[Optional[str]]:
+            async with semaphore:
+                return await self.azure_clients.run_blocking(self.azure_clients.analyze_sentiment_batch, chunk)
+        
+        chunks = await asyncio.gather(*(
+            score(texts[start:start + SENTIMENT_BATCH_SIZE])
+            for start in range(0, len(texts), SENTIMENT_BATCH_SIZE)
+        ))
+        return [sentiment for chunk in chunks for sentiment in chunk]
+    
+    async def submit_sentiment_batch(self, entries: List[Dict[str, Any]]) -> str:
+        if not self.azure_clients.openai_batch_deployment:
+            raise ValueError("AZURE_OPENAI_BATCH_DEPLOYMENT is not set; sentiment batches need a GlobalBatch deployment")
+        
+        requests = b"\n".join(
+            orjson.dumps({
+                "custom_id": entry["id"],
+                "method": "POST",
+                "url": "/chat/completions",
+                "body": {
+                    "model": self.azure_clients.openai_batch_deployment,
+                    "messages": [
+                        {"role": "system", "content": "Classify the sentiment of this health diary entry. Respond with exactly one word: positive, negative, neutral, or mixed."},
+                        {"role": "user", "content": entry["text"]}
+                    ],
+                    "temperature": 0,
+                    "max_tokens": 2
+                }
+            })
+            for entry in entries
+        )
+        
+        client = self.azure_clients.async_openai_client
+        batch_file = await client.files.create(file=("diary_sentiment.jsonl", requests), purpose="batch")
+        batch = await client.batches.create(input_file_id=batch_file.id, endpoint="/chat/completions", completion_window="24h")
+        logger.info("Submitted sentiment batch %s for %s diary entries", batch.id, len(entries))
+        return batch.id
+    
+    async def poll_sentiment_batch(self, batch_id: str) -> Tuple[str, Optional[Dict[str, Optional[str]]]]:
+        client = self.azure_clients.async_openai_client
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status != "completed" or not batch.output_file_id:
+            return batch.status, None
+        
+        output = await client.files.content(batch.output_file_id)
+        sentiments = {}
+        for line in output.content.splitlines():
+            if not line.strip():
+                continue
+            result = orjson.loads(line)
+            choices = ((result.get("response") or {}).get("body") or {}).get("choices") or []
+            label = choices[0]["message"]["content"].strip().lower().rstrip(".") if choices else None
+            sentiments[result["custom_id"]] = label if label in SENTIMENT_LABELS else None
+        return batch.status, sentiments
     
-    def generate_summary(self, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _build_summary(self, entries: List[Dict[str, Any]], suggestions: List[str]) -> Dict[str, Any]:
         if not entries:
             return {
                 "total_entries": 0,
@@ -22,45 +141,46 @@ class DiaryPipeline:
                 "visualization_data": {}
             }
         
-        dates = [entry.get("timestamp", datetime.now()) for entry in entries]
-        
-        diseases = {}
-        moods = {}
+        now = datetime.now(timezone.utc)
+        start = end = None
+        diseases = Counter()
+        moods = Counter()
+        time_series = []
+        sentiment_trend = []
         for entry in entries:
-            if entry.get("entry_type") == "disease":
-                text = entry.get("text", "").lower()
-                common_diseases = ["diabetes", "hypertension", "asthma", "arthritis", "heart disease", "cancer", "thyroid", "copd", "depression", "anxiety"]
-                for disease in common_diseases:
-                    if disease in text:
-                        diseases[disease] = diseases.get(disease, 0) + 1
-            
-            if entry.get("entry_type") == "mood":
-                mood_text = entry.get("text", "").lower()
-                if "happy" in mood_text or "good" in mood_text:
-                    moods["positive"] = moods.get("positive", 0) + 1
-                elif "sad" in mood_text or "bad" in mood_text:
-                    moods["negative"] = moods.get("negative", 0) + 1
+            date = entry.get("timestamp") or now
+            if start is None or date < start:
+                start = date
+            if end is None or date > end:
+                end = date
+            date_iso = date.isoformat()
+            entry_type = entry.get("entry_type", "food")
+            time_series.append({"date": date_iso, "type": entry_type})
+            
+            sentiment = entry.get("sentiment")
+            if sentiment:
+                sentiment_trend.append({"date": date_iso, "sentiment": sentiment})
+            
+            if entry_type == "disease":
+                diseases.update(set(_DISEASE_PATTERN.findall(entry.get("text", "").lower())))
+            elif entry_type == "mood":
+                mood_text = entry.get("text", "")
+                if _POSITIVE_MOOD_PATTERN.search(mood_text):
+                    moods["positive"] += 1
+                elif _NEGATIVE_MOOD_PATTERN.search(mood_text):
+                    moods["negative"] += 1
                 else:
-                    moods["neutral"] = moods.get("neutral", 0) + 1
-        
-        suggestions = self._generate_suggestions(entries)
-        
-        time_series = []
-        for i, entry in enumerate(entries):
-            time_series.append({
-                "date": entry.get("timestamp", datetime.now()).isoformat(),
-                "type": entry.get("entry_type", "food")
-            })
+                    moods["neutral"] += 1
         
         return {
             "total_entries": len(entries),
             "date_range": {
-                "start": min(dates).isoformat() if dates else datetime.now().isoformat(),
-                "end": max(dates).isoformat() if dates else datetime.now().isoformat()
+                "start": start.isoformat(),
+                "end": end.isoformat()
             },
-            "sentiment_trend": [],
+            "sentiment_trend": sentiment_trend,
             "common_diseases": [
-                {"disease": k, "count": v} for k, v in sorted(diseases.items(), key=lambda x: x[1], reverse=True)[:5]
+                {"disease": k, "count": v} for k, v in diseases.most_common(5)
             ],
             "mood_patterns": [
                 {"mood": k, "count": v} for k, v in moods.items()
@@ -71,34 +191,58 @@ class DiaryPipeline:
             }
         }
     
-    def _generate_suggestions(self, entries: List[Dict[str, Any]]) -> List[str]:
-        if not self.azure_clients.openai_client or not entries:
+    def _suggestions_request(self, entries: List[Dict[str, Any]]) -> Tuple[bytes, List[Dict[str, str]]]:
+        recent_entries = entries[-10:] if len(entries) > 10 else entries
+        entries_text = "\n".join([
+            f"{entry.get('entry_type', 'general')}: {entry.get('text', '')}"
+            for entry in recent_entries
+        ])
+        
+        key = hashlib.blake2b(" ".join(entries_text.lower().split()).encode(), digest_size=16).digest()
+        messages = [
+            {"role": "system", "content": "You are a health assistant. Provide 2-3 gentle, actionable suggestions based on health diary entries. Be supportive and professional. Format as a simple list."},
+            {"role": "user", "content": f"Based on these diary entries, provide suggestions:\n{entries_text}"}
+        ]
+        return key, messages
+    
+    def _cached_suggestions(self, key: bytes) -> Optional[List[str]]:
+        with self._suggestions_cache_lock:
+            cached = self._suggestions_cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < SUGGESTIONS_CACHE_TTL:
+                self._suggestions_cache.move_to_end(key)
+                return list(cached[1])
+        return None
+    
+    def _store_suggestions(self, key: bytes, suggestions_text: str) -> List[str]:
+        suggestions = [
+            s.strip().lstrip("- ").lstrip("* ")
+            for s in suggestions_text.strip().split("\n")
+            if s.strip()
+        ][:3]
+        with self._suggestions_cache_lock:
+            self._suggestions_cache[key] = (time.monotonic(), suggestions)
+            self._suggestions_cache.move_to_end(key)
+            while len(self._suggestions_cache) > SUGGESTIONS_CACHE_SIZE:
+                self._suggestions_cache.popitem(last=False)
+        return list(suggestions)
+    
+    async def _generate_suggestions_async(self, entries: List[Dict[str, Any]]) -> List[str]:
+        if not self.azure_clients.async_openai_client or not entries:
             return []
         
         try:
-            recent_entries = entries[-10:] if len(entries) > 10 else entries
-            entries_text = "\n".join([
-                f"{entry.get('entry_type', 'general')}: {entry.get('text', '')}"
-                for entry in recent_entries
-            ])
+            key, messages = self._suggestions_request(entries)
+            cached = self._cached_suggestions(key)
+            if cached is not None:
+                return cached
             
-            response = self.azure_clients.openai_client.chat.completions.create(
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
-                messages=[
-                    {"role": "system", "content": "You are a health assistant. Provide 2-3 gentle, actionable suggestions based on health diary entries. Be supportive and professional. Format as a simple list."},
-                    {"role": "user", "content": f"Based on these diary entries, provide suggestions:\n{entries_text}"}
-                ],
+                messages=messages,
                 temperature=0.7,
                 max_tokens=200
             )
-            
-            suggestions_text = response.choices[0].message.content.strip()
-            suggestions = [
-                s.strip().lstrip("- ").lstrip("* ")
-                for s in suggestions_text.split("\n")
-                if s.strip()
-            ]
-            return suggestions[:3]
+            return self._store_suggestions(key, response.choices[0].message.content)
         except:
             return ["Consider maintaining regular sleep patterns", "Stay hydrated throughout the day"]
 
@@ -108,6 +252,17 @@ class SOAPPipeline:
     def __init__(self, azure_clients: AzureClients):
         self.azure_clients = azure_clients
         self.nlm_api_base = "https://clinicaltables.nlm.nih.gov/api/conditions/v3/search"
+        self._soap_cache = OrderedDict()
+        self._soap_inflight: Dict[bytes, asyncio.Future] = {}
+    
+    def _soap_cache_key(self, transcription: str, diary_entries: Optional[List[Dict]], gender: Optional[str]) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(" ".join(transcription.lower().split()).encode())
+        digest.update(b"\0")
+        digest.update(orjson.dumps(diary_entries or [], option=orjson.OPT_SORT_KEYS, default=str))
+        digest.update(b"\0")
+        digest.update((gender or "").encode())
+        return digest.digest()
     
     async def _query_nlm_conditions(self, symptoms: List[str], max_results: int = 50) -> List[Dict[str, Any]]:
         try:
@@ -119,10 +274,9 @@ class SOAPPipeline:
                 "ef": "icd10cm_codes,icd10cm,term_icd9_code,term_icd9_text"
             }
             
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(self.nlm_api_base, params=params)
-                response.raise_for_status()
-                data = response.json()
+            response = await self.azure_clients.async_http_client.get(self.nlm_api_base, params=params, timeout=10.0)
+            response.raise_for_status()
+            data = response.json()
             
             if len(data) < 2:
                 return []
@@ -162,14 +316,14 @@ class SOAPPipeline:
                     "icd9_text": icd9_text
                 })
             
-            print(f"[DIFFERENTIAL] Found {len(conditions)} possible conditions from NLM API")
+            logger.debug("[DIFFERENTIAL] Found %s possible conditions from NLM API", len(conditions))
             return conditions[:max_results]
         except Exception as e:
-            print(f"[DIFFERENTIAL] Error querying NLM API: {e}")
+            logger.error("[DIFFERENTIAL] Error querying NLM API: %s", e)
             return []
     
     async def _perform_differential_diagnosis(self, transcription: str, diary_entries: Optional[List[Dict]] = None, gender: Optional[str] = None) -> Dict[str, Any]:
-        if not self.azure_clients.openai_client:
+        if not self.azure_clients.async_openai_client:
             return {"possible_conditions": [], "eliminated_conditions": [], "final_diagnoses": []}
         
         try:
@@ -181,7 +335,7 @@ Patient dictation:
 Respond with ONLY a comma-separated list of symptoms, nothing else. Example: "headache, nausea, fever, facial swelling"
 """
             
-            response = self.azure_clients.openai_client.chat.completions.create(
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
                 messages=[
                     {"role": "system", "content": "You are a medical symptom extractor. Extract symptoms from patient descriptions."},
@@ -193,7 +347,7 @@ Respond with ONLY a comma-separated list of symptoms, nothing else. Example: "he
             
             symptoms_text = response.choices[0].message.content.strip()
             symptoms = [s.strip() for s in symptoms_text.split(",") if s.strip()]
-            print(f"[DIFFERENTIAL] Extracted symptoms: {symptoms}")
+            logger.debug("[DIFFERENTIAL] Extracted symptoms: %s", symptoms)
             
             if not symptoms:
                 return {"possible_conditions": [], "eliminated_conditions": [], "final_diagnoses": []}
@@ -201,7 +355,7 @@ Respond with ONLY a comma-separated list of symptoms, nothing else. Example: "he
             conditions = await self._query_nlm_conditions(symptoms, max_results=30)
             
             if not conditions:
-                print("[DIFFERENTIAL] No conditions found from NLM API")
+                logger.debug("[DIFFERENTIAL] No conditions found from NLM API")
                 return {"possible_conditions": [], "eliminated_conditions": [], "final_diagnoses": []}
             
             diary_context = ""
@@ -259,7 +413,7 @@ Respond with ONLY a comma-separated list of symptoms, nothing else. Example: "he
                 
                 if diary_parts:
                     diary_context = "\n".join(diary_parts)
-                    print(f"[DIFFERENTIAL] Diary context prepared: {len(chronic_conditions)} chronic conditions, {len(genetic_conditions)} genetic conditions, {len(allergies)} allergies, {len(past_illnesses)} past illnesses, {len(medications)} medications, {len(vitals)} vitals, {len(lifestyle_risks)} lifestyle risks, {len(family_history)} family history entries")
+                    logger.debug("[DIFFERENTIAL] Diary context prepared: %s chronic conditions, %s genetic conditions, %s allergies, %s past illnesses, %s medications, %s vitals, %s lifestyle risks, %s family history entries", len(chronic_conditions), len(genetic_conditions), len(allergies), len(past_illnesses), len(medications), len(vitals), len(lifestyle_risks), len(family_history))
             
             conditions_list = "\n".join([
                 f"{i+1}. {c['consumer_name']} (ICD-10: {', '.join(c['icd10_codes']) if c['icd10_codes'] else 'N/A'})"
@@ -311,7 +465,7 @@ ELIMINATE: [condition number] - [condition name] - [brief reason why it's imposs
 
 List ALL conditions. Be thorough and logical. Think like Dr. House - eliminate what doesn't fit. Always reference the specific disease/condition from the diary when eliminating."""
             
-            response = self.azure_clients.openai_client.chat.completions.create(
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
                 messages=[
                     {"role": "system", "content": "You are a diagnostic expert like Dr. House. You eliminate impossible diagnoses through logical deduction based on symptom patterns and medical history."},
@@ -322,7 +476,7 @@ List ALL conditions. Be thorough and logical. Think like Dr. House - eliminate w
             )
             
             elimination_text = response.choices[0].message.content.strip()
-            print(f"[DIFFERENTIAL] Elimination analysis:\n{elimination_text[:500]}...")
+            logger.debug("[DIFFERENTIAL] Elimination analysis:\n%s...", elimination_text[:500])
             
             kept_conditions = []
             eliminated_conditions = []
@@ -354,7 +508,7 @@ List ALL conditions. Be thorough and logical. Think like Dr. House - eliminate w
                         except:
                             pass
             
-            print(f"[DIFFERENTIAL] Kept {len(kept_conditions)} conditions, eliminated {len(eliminated_conditions)}")
+            logger.debug("[DIFFERENTIAL] Kept %s conditions, eliminated %s", len(kept_conditions), len(eliminated_conditions))
             
             return {
                 "possible_conditions": conditions,
@@ -364,16 +518,49 @@ List ALL conditions. Be thorough and logical. Think like Dr. House - eliminate w
                 "diary_context": diary_context
             }
         except Exception as e:
-            print(f"[DIFFERENTIAL] Error in differential diagnosis: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[DIFFERENTIAL] Error in differential diagnosis: %s", e)
             return {"possible_conditions": [], "eliminated_conditions": [], "final_diagnoses": []}
     
-    async def generate_soap_note(self, transcription: str, health_entities: Optional[Dict] = None, diary_entries: Optional[List[Dict]] = None, gender: Optional[str] = None) -> Dict[str, str]:
-        if not self.azure_clients.openai_client:
-            print("WARNING: OpenAI client not available, using fallback SOAP generation")
+    async def generate_soap_note(self, transcription: str, health_entities: Optional[Dict] = None, diary_entries: Optional[List[Dict]] = None, gender: Optional[str] = None, on_delta: Optional[Callable[[str], Awaitable[None]]] = None) -> Dict[str, str]:
+        if not self.azure_clients.async_openai_client:
+            logger.warning("OpenAI client not available, using fallback SOAP generation")
             return self._generate_fallback_soap(transcription, health_entities)
         
+        if health_entities is not None:
+            return await self._generate_soap_note(transcription, health_entities, diary_entries, gender, on_delta)
+        
+        cache_key = self._soap_cache_key(transcription, diary_entries, gender)
+        cached = self._soap_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < SOAP_CACHE_TTL:
+            self._soap_cache.move_to_end(cache_key)
+            return dict(cached[1])
+        
+        # Identical requests that arrive mid-generation share its result; if the owner is cancelled a waiter takes over
+        while (inflight := self._soap_inflight.get(cache_key)) is not None:
+            try:
+                return dict(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+        
+        future = asyncio.get_running_loop().create_future()
+        self._soap_inflight[cache_key] = future
+        try:
+            soap_note = await self._generate_soap_note(transcription, None, diary_entries, gender, on_delta, cache_key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._soap_inflight.pop(cache_key, None)
+        
+        future.set_result(dict(soap_note))
+        return soap_note
+    
+    async def _generate_soap_note(self, transcription: str, health_entities: Optional[Dict], diary_entries: Optional[List[Dict]], gender: Optional[str], on_delta: Optional[Callable[[str], Awaitable[None]]], cache_key: Optional[bytes] = None) -> Dict[str, str]:
         try:
             differential_result = await self._perform_differential_diagnosis(transcription, diary_entries, gender)
             kept_diagnoses = [dc["condition"]["consumer_name"] for dc in differential_result.get("kept_conditions", [])]
@@ -434,30 +621,25 @@ List ALL conditions. Be thorough and logical. Think like Dr. House - eliminate w
                         diary_context += "MEDICATIONS:\n" + "\n".join(medication_entries) + "\n"
                     diary_context += "=== END DIARY ENTRIES ===\n"
                     context += diary_context
-                    print(f"Including {len(medical_entries)} medical entries and {len(medication_entries)} medication entries in SOAP context:")
-                    for entry in medical_entries + medication_entries:
-                        print(f"  - {entry}")
+                    logger.debug("Including %s medical entries and %s medication entries in SOAP context:", len(medical_entries), len(medication_entries))
+                    if logger.isEnabledFor(logging.DEBUG):
+                        for entry in medical_entries + medication_entries:
+                            logger.debug("  - %s", entry)
+            
+            json_mode = on_delta is None
+            if json_mode:
+                headings = {section: f'"{section}" value:' for section in SOAP_SECTION_MARKERS}
+            else:
+                headings = {section: f"==={section.upper()}===" for section in SOAP_SECTION_MARKERS}
             
-            system_prompt = """You are a clinical documentation assistant. Your role is to create professional SOAP notes in standard clinical format.
+            system_prompt = f"""You are a clinical documentation assistant. Your role is to create professional SOAP notes in standard clinical format.
 
 CRITICAL RULES:
 1. ONLY use information explicitly mentioned in the input. DO NOT add details that were not provided.
 2. Write as a clinical document, not a conversation. Use third person, objective medical language.
 3. Do NOT use "you", "you should", "you mentioned", or any direct address to the patient.
 4. Use concise, professional clinical phrasing. Avoid long paragraphs.
-5. Format your response EXACTLY as follows with clear section headers:
-
-===SUBJECTIVE===
-[Content here]
-
-===OBJECTIVE===
-[Content here]
-
-===ASSESSMENT===
-[Content here]
-
-===PLAN===
-[Content here]"""
+5. {SOAP_JSON_INSTRUCTION if json_mode else SOAP_HEADER_INSTRUCTION}"""
 
             diary_instruction = ""
             if diary_context:
@@ -473,9 +655,9 @@ Patient dictation:
 {gender_info}
 IMPORTANT: The diary entries shown above are PART OF THE PATIENT'S MEDICAL RECORD. You MUST include them in your SOAP note. They are not optional - they are documented medical history.
 
-Generate a SOAP note in clinical format:
+{"Generate a SOAP note as a JSON object in clinical format:" if json_mode else "Generate a SOAP note in clinical format:"}
 
-===SUBJECTIVE===
+{headings["subjective"]}
 Document what the patient reported AND their medical history from diary entries:
 - Chief complaint in patient's words
 - History of present illness: symptoms, timing, severity, location (from dictation)
@@ -484,7 +666,7 @@ Document what the patient reported AND their medical history from diary entries:
 - Write in third person, concise clinical language
 - Example: "Patient reports [symptom]. Past medical history: [list ALL diseases from diary]. Current medications: [list ALL medications from diary]. Denies [if mentioned]."
 
-===OBJECTIVE===
+{headings["objective"]}
 Document only measurable or observable findings:
 - Vital signs if mentioned (BP, HR, RR, Temp, O2 sat)
 - Physical examination findings if described
@@ -493,7 +675,7 @@ Document only measurable or observable findings:
 - Use third person, objective clinical language
 - Keep it concise and factual
 
-===ASSESSMENT===
+{headings["assessment"]}
 Provide differential diagnoses with clinical reasoning:
 - CRITICAL: Use the differential diagnosis analysis provided above. The system has already eliminated impossible diagnoses based on symptom contradictions and medical history.
 - Primary diagnosis: Choose from the "Possible diagnoses (after elimination)" list above, prioritizing the most likely based on symptom pattern
@@ -505,7 +687,7 @@ Provide differential diagnoses with clinical reasoning:
 - Use medical terminology and standard diagnostic criteria
 - Format as concise clinical text, not long paragraphs
 
-===PLAN===
+{headings["plan"]}
 Document clear clinical management steps:
 - Medications with dosages if appropriate
 - Consider existing medications from diary entries - check for interactions or adjustments needed
@@ -523,38 +705,58 @@ Document clear clinical management steps:
 
 Remember: Write as a clinical document. Use third person. Be concise and professional. Reference diary entries for medical history, existing conditions, and medications. Consider patient gender when documenting conditions and treatment plans."""
 
-            print(f"Calling Azure OpenAI with transcription: {transcription[:100]}...")
-            print(f"OpenAI client available: {self.azure_clients.openai_client is not None}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Calling Azure OpenAI with transcription: %s...", transcription[:100])
+                logger.debug("OpenAI client available: %s", self.azure_clients.async_openai_client is not None)
             
-            response = self.azure_clients.openai_client.chat.completions.create(
+            if json_mode:
+                output_options = {"response_format": {"type": "json_object"}}
+            else:
+                output_options = {"stream": True}
+            
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.4,
-                max_tokens=2000
+                max_tokens=2000,
+                **output_options
             )
             
-            soap_text = response.choices[0].message.content.strip()
-            print(f"AI Response received (length: {len(soap_text)}): {soap_text[:200]}...")
+            if not json_mode:
+                parts = []
+                async for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        await on_delta(delta)
+                soap_text = "".join(parts).strip()
+            else:
+                soap_text = response.choices[0].message.content.strip()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("AI Response received (length: %s): %s...", len(soap_text), soap_text[:200])
             
             soap_note = self._parse_soap_response(soap_text, transcription)
-            print(f"Parsed SOAP note - Subjective: {len(soap_note.get('subjective', ''))} chars, Assessment: {len(soap_note.get('assessment', ''))} chars")
+            logger.debug("Parsed SOAP note - Subjective: %s chars, Assessment: %s chars", len(soap_note.get('subjective', '')), len(soap_note.get('assessment', '')))
             
             if not soap_note.get("assessment") or "pending" in soap_note.get("assessment", "").lower() or "to be" in soap_note.get("assessment", "").lower():
-                print("WARNING: AI generated placeholder text, trying again with more explicit instructions")
-                return self._retry_soap_generation(transcription, health_entities, diary_entries)
+                logger.warning("AI generated placeholder text, trying again with more explicit instructions")
+                return await self._retry_soap_generation(transcription, health_entities, diary_entries)
             
+            if cache_key is not None:
+                self._soap_cache[cache_key] = (time.monotonic(), dict(soap_note))
+                self._soap_cache.move_to_end(cache_key)
+                while len(self._soap_cache) > SOAP_CACHE_SIZE:
+                    self._soap_cache.popitem(last=False)
             return soap_note
         except Exception as e:
-            print(f"Error generating SOAP note: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error generating SOAP note: %s", e)
             return self._generate_fallback_soap(transcription, health_entities)
     
     async def update_soap_incremental(self, new_text_chunk: str, current_soap: Dict[str, str], full_transcript: str, diary_entries: Optional[List[Dict]] = None, gender: Optional[str] = None) -> Dict[str, str]:
-        if not self.azure_clients.openai_client:
+        if not self.azure_clients.async_openai_client:
             return current_soap
         
         try:
@@ -614,28 +816,19 @@ Rules:
 - Maintain clinical format and third-person language
 - Reference diary entries if relevant
 
-Return the updated SOAP note in this exact format:
-
-===SUBJECTIVE===
-[Updated subjective section]
-
-===OBJECTIVE===
-[Updated objective section]
-
-===ASSESSMENT===
-[Updated assessment section]
+Return the updated SOAP note as a JSON object with exactly these keys:
 
-===PLAN===
-[Updated plan section]"""
+{{"subjective": "[Updated subjective section]", "objective": "[Updated objective section]", "assessment": "[Updated assessment section]", "plan": "[Updated plan section]"}}"""
 
-            response = self.azure_clients.openai_client.chat.completions.create(
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
                 messages=[
-                    {"role": "system", "content": "You are a clinical documentation assistant. Update SOAP notes incrementally by merging new information into existing sections."},
+                    {"role": "system", "content": "You are a clinical documentation assistant. Update SOAP notes incrementally by merging new information into existing sections. " + SOAP_JSON_INSTRUCTION},
                     {"role": "user", "content": update_prompt}
                 ],
                 temperature=0.3,
-                max_tokens=2000
+                max_tokens=2000,
+                response_format={"type": "json_object"}
             )
             
             soap_text = response.choices[0].message.content.strip()
@@ -643,11 +836,11 @@ Return the updated SOAP note in this exact format:
             
             return updated_soap
         except Exception as e:
-            print(f"Error in incremental SOAP update: {e}")
+            logger.error("Error in incremental SOAP update: %s", e)
             return current_soap
     
     def _generate_fallback_soap(self, transcription: str, health_entities: Optional[Dict] = None) -> Dict[str, str]:
-        print("WARNING: Using rule-based fallback. OpenAI client should be configured for dynamic AI analysis.")
+        logger.warning("Using rule-based fallback. OpenAI client should be configured for dynamic AI analysis.")
         transcription_lower = transcription.lower()
         
         symptoms_found = []
@@ -766,7 +959,7 @@ Return the updated SOAP note in this exact format:
             "plan": plan
         }
     
-    def _retry_soap_generation(self, transcription: str, health_entities: Optional[Dict] = None, diary_entries: Optional[List[Dict]] = None) -> Dict[str, str]:
+    async def _retry_soap_generation(self, transcription: str, health_entities: Optional[Dict] = None, diary_entries: Optional[List[Dict]] = None) -> Dict[str, str]:
         try:
             context = transcription
             if health_entities and health_entities.get("entities"):
@@ -789,33 +982,26 @@ Return the updated SOAP note in this exact format:
 
 Patient dictation: {context}
 
-Format your response EXACTLY as:
-
-===SUBJECTIVE===
-[Only what patient reported - third person, clinical language]
-
-===OBJECTIVE===
-[Only measurable/observable findings, or "No objective findings documented" if none]
-
-===ASSESSMENT===
-[Differential diagnoses with reasoning - concise clinical text]
+Respond with a JSON object with exactly these keys:
 
-===PLAN===
-[Clinical management steps - medical phrasing, not advice. Format with each numbered item on a separate line:
-1. First step
-2. Second step
-3. Third step]
+{{
+  "subjective": "[Only what patient reported - third person, clinical language]",
+  "objective": "[Only measurable/observable findings, or 'No objective findings documented' if none]",
+  "assessment": "[Differential diagnoses with reasoning - concise clinical text]",
+  "plan": "[Clinical management steps - medical phrasing, not advice. Each numbered item on its own line: 1. First step\\n2. Second step\\n3. Third step]"
+}}
 
 Write as a clinical document. Use third person. Be concise. Only use information actually mentioned."""
 
-            response = self.azure_clients.openai_client.chat.completions.create(
+            response = await self.azure_clients.async_openai_client.chat.completions.create(
                 model=self.azure_clients.openai_deployment,
                 messages=[
-                    {"role": "system", "content": "You are a medical assistant. Generate complete SOAP notes with real diagnoses and treatment plans. Never use placeholder text."},
+                    {"role": "system", "content": "You are a medical assistant. Generate complete SOAP notes with real diagnoses and treatment plans. Never use placeholder text. " + SOAP_JSON_INSTRUCTION},
                     {"role": "user", "content": retry_prompt}
                 ],
                 temperature=0.5,
-                max_tokens=2000
+                max_tokens=2000,
+                response_format={"type": "json_object"}
             )
             
             soap_text = response.choices[0].message.content.strip()
@@ -831,14 +1017,24 @@ Write as a clinical document. Use third person. Be concise. Only use information
             "plan": ""
         }
         
-        text_lower = soap_text.lower()
+        if soap_text.startswith("{"):
+            try:
+                parsed = orjson.loads(soap_text)
+            except orjson.JSONDecodeError:
+                parsed = None
+            if isinstance(parsed, dict):
+                parsed = {k.lower(): v for k, v in parsed.items()}
+                for section in sections:
+                    value = parsed.get(section)
+                    if isinstance(value, list):
+                        sections[section] = "\n".join(map(str, value))
+                    elif value is not None:
+                        sections[section] = str(value)
+            if not any(section.strip() for section in sections.values()):
+                logger.warning("SOAP JSON response had no usable sections, using fallback SOAP generation")
+                return self._generate_fallback_soap(transcription)
         
-        section_markers = {
-            "subjective": ["===subjective===", "subjective:", "**subjective**", "subjective (s):", "s:"],
-            "objective": ["===objective===", "objective:", "**objective**", "objective (o):", "o:"],
-            "assessment": ["===assessment===", "assessment:", "**assessment**", "assessment (a):", "a:", "impression:", "diagnosis:"],
-            "plan": ["===plan===", "plan:", "**plan**", "plan (p):", "p:", "treatment plan:"]
-        }
+        text_lower = soap_text.lower()
         
         section_keywords = {
             "subjective": ["subjective", "chief complaint", "history of present illness", "hpi"],
@@ -847,7 +1043,7 @@ Write as a clinical document. Use third person. Be concise. Only use information
             "plan": ["plan", "treatment", "follow-up", "management", "treatment plan"]
         }
         
-        lines = soap_text.split("\n")
+        lines = soap_text.split("\n") if not any(sections.values()) else []
         current_section = None
         collecting = False
         
@@ -858,39 +1054,15 @@ Write as a clinical document. Use third person. Be concise. Only use information
                     sections[current_section] += "\n"
                 continue
                 
-            line_lower = line_stripped.lower()
-            
-            section_found = False
-            for section, markers in section_markers.items():
-                for marker in markers:
-                    if line_lower.startswith(marker):
-                        current_section = section
-                        collecting = True
-                        section_found = True
-                        remaining = line_stripped[len(marker):].strip().lstrip(":").strip().lstrip("-").strip()
-                        if remaining:
-                            sections[current_section] = remaining
-                        else:
-                            sections[current_section] = ""
-                        break
-                if section_found:
-                    break
-            
-            if not section_found and collecting and current_section:
-                next_section_marker = False
-                for other_section, other_markers in section_markers.items():
-                    if other_section != current_section:
-                        for marker in other_markers:
-                            if line_lower.startswith(marker):
-                                next_section_marker = True
-                                break
-                        if next_section_marker:
-                            break
-                
-                if not next_section_marker:
-                    if sections[current_section] and not sections[current_section].endswith("\n"):
-                        sections[current_section] += "\n"
-                    sections[current_section] += line_stripped
+            header = _SOAP_HEADER_RE.match(line_stripped)
+            if header:
+                current_section = header.lastgroup
+                collecting = True
+                sections[current_section] = line_stripped[header.end():].strip().lstrip(":").strip().lstrip("-").strip()
+            elif collecting and current_section:
+                if sections[current_section] and not sections[current_section].endswith("\n"):
+                    sections[current_section] += "\n"
+                sections[current_section] += line_stripped
         
         if not any(sections.values()):
             for section, keywords in section_keywords.items():
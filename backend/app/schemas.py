@@ -20,9 +20,15 @@ class DiaryEntryResponse(BaseModel):
     suggestions: List[str] = []
 
 
+class DiaryEntriesBatchResponse(BaseModel):
+    entries: List[DiaryEntryResponse]
+    suggestions: List[str] = []
+
+
 class DiarySummaryResponse(BaseModel):
     total_entries: int
     date_range: Dict[str, str]
+    sentiment_trend: List[Dict[str, Any]] = []
     common_diseases: List[Dict[str, Any]]
     mood_patterns: List[Dict[str, Any]]
     suggestions: List[str]
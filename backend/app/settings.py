@@ -0,0 +1,48 @@
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import NonNegativeFloat, NonNegativeInt, PositiveFloat, PositiveInt
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True, extra="ignore")
+    
+    azure_speech_key: Optional[str] = None
+    azure_speech_region: str = "eastus"
+    azure_openai_endpoint: Optional[str] = None
+    azure_openai_api_key: Optional[str] = None
+    azure_openai_api_version: str = "2025-01-01-preview"
+    azure_openai_deployment: Optional[str] = None
+    azure_openai_batch_deployment: Optional[str] = None
+    azure_text_analytics_endpoint: Optional[str] = None
+    azure_text_analytics_key: Optional[str] = None
+    npi_default_state: str = "NY"
+    npi_default_city: str = ""
+    npi_search_limit: int = 10
+    redis_url: Optional[str] = None
+    
+    log_level: str = "INFO"
+    max_request_bytes: PositiveInt = 16 * 1024 * 1024
+    npi_cache_ttl: NonNegativeFloat = 900
+    diary_max_entries: PositiveInt = 10000
+    diary_entry_ttl_days: NonNegativeFloat = 0
+    health_refresh_seconds: PositiveFloat = 5
+    uvicorn_workers: PositiveInt = 1
+    
+    azure_workers: PositiveInt = 32
+    azure_http_pool: PositiveInt = 100
+    azure_stt_pool_size: NonNegativeInt = 4
+    azure_stt_max_bytes: PositiveInt = 10 * 1024 * 1024
+    azure_stt_interactive_slots: PositiveInt = 2
+    azure_stt_background_slots: PositiveInt = 4
+    azure_stt_background_queue: NonNegativeInt = 16
+    azure_stt_streaming_slots: PositiveInt = 4
+    stt_interactive_max_seconds: PositiveFloat = 30
+    azure_ta_batch_window_ms: NonNegativeFloat = 20
+    azure_ta_cache_ttl: NonNegativeFloat = 3600
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
@@ -1,32 +1,69 @@
-import base64
+import binascii
 import io
+import struct
 import wave
+
+import pybase64
 from typing import Tuple
 
 
+_RIFF_HEADER = struct.Struct("<4sI4s")
+_CHUNK_HEADER = struct.Struct("<4sI")
+_FMT_FIELDS = struct.Struct("<HHIIHH")
+
+
 def decode_audio_base64(audio_base64: str) -> bytes:
     if audio_base64.startswith("data:audio"):
-        audio_base64 = audio_base64.split(",")[1]
+        audio_base64 = audio_base64.partition(",")[2]
     
-    return base64.b64decode(audio_base64)
+    return pybase64.b64decode(audio_base64, validate=False)
 
 
-def validate_audio_format(audio_data: bytes) -> Tuple[bool, str]:
+def validate_audio_header_b64(audio_base64: str) -> Tuple[bool, str]:
+    if audio_base64.startswith("data:audio"):
+        audio_base64 = audio_base64[audio_base64.find(",", 0, 128) + 1:]
+    
     try:
-        audio_io = io.BytesIO(audio_data)
-        with wave.open(audio_io, 'rb') as wav_file:
-            frames = wav_file.getnframes()
-            sample_rate = wav_file.getframerate()
-            channels = wav_file.getnchannels()
-            
+        header = pybase64.b64decode(audio_base64[:64])
+    except (binascii.Error, ValueError) as e:
+        return False, f"Invalid base64 audio data: {str(e)}"
+    
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE' or header[12:16] != b'fmt ' or len(header) < 28:
+        return True, "Header not conclusive, deferring to full validation"
+    
+    channels, sample_rate = struct.unpack_from("<HI", header, 22)
+    if sample_rate < 8000 or sample_rate > 48000:
+        return False, f"Unsupported sample rate: {sample_rate}"
+    if channels not in [1, 2]:
+        return False, f"Unsupported channels: {channels}"
+    return True, f"Valid WAV header: {sample_rate}Hz, {channels} channel(s)"
+
+
+def validate_audio_format(audio_data: bytes) -> Tuple[bool, str]:
+    mv = memoryview(audio_data)
+    if len(mv) < _RIFF_HEADER.size:
+        return True, "Audio format accepted (Azure Speech will handle conversion): header too short"
+    riff, _, wave_id = _RIFF_HEADER.unpack_from(mv, 0)
+    if (riff, wave_id) != (b'RIFF', b'WAVE'):
+        return True, "Audio format accepted (Azure Speech will handle conversion): not a RIFF/WAVE file"
+    
+    channels = sample_rate = block_align = None
+    offset = _RIFF_HEADER.size
+    while offset + _CHUNK_HEADER.size <= len(mv):
+        chunk_id, chunk_size = _CHUNK_HEADER.unpack_from(mv, offset)
+        offset += _CHUNK_HEADER.size
+        if chunk_id == b'fmt ' and offset + _FMT_FIELDS.size <= len(mv):
+            _, channels, sample_rate, _, block_align, _ = _FMT_FIELDS.unpack_from(mv, offset)
+        elif chunk_id == b'data' and channels is not None:
             if sample_rate < 8000 or sample_rate > 48000:
                 return False, f"Unsupported sample rate: {sample_rate}"
             if channels not in [1, 2]:
                 return False, f"Unsupported channels: {channels}"
-            
+            frames = min(chunk_size, len(mv) - offset) // (block_align or 1)
             return True, f"Valid WAV: {sample_rate}Hz, {channels} channel(s), {frames} frames"
-    except Exception as e:
-        return True, f"Audio format accepted (Azure Speech will handle conversion): {str(e)}"
+        offset += chunk_size + (chunk_size & 1)
+    
+    return True, "Audio format accepted (Azure Speech will handle conversion): incomplete WAV header"
 
 
 def get_audio_duration(audio_data: bytes) -> float:
@@ -7,6 +7,7 @@ let clinicalWebSocket = null;
 let clinicalAudioContext = null;
 let clinicalMediaStream = null;
 let clinicalTranscript = "";
+let soapStreamText = "";
 let clinicalSOAP = {
     subjective: "",
     objective: "No objective findings documented.",
@@ -75,7 +76,7 @@ document.getElementById('diary-form').addEventListener('submit', async (e) => {
     
     const entryType = document.getElementById('entry-type').value;
     let text = document.getElementById('diary-text').value;
-    const audioData = audioChunks.length > 0 ? await getAudioBase64() : null;
+    const audioData = audioChunks.length > 0 ? await getAudioBlob() : null;
     
     if (!text && !audioData) {
         showNotification('Please enter text or record audio.', 'error');
@@ -87,7 +88,7 @@ document.getElementById('diary-form').addEventListener('submit', async (e) => {
     try {
         if (audioData && !text) {
             const formData = new FormData();
-            formData.append('audio_data', audioData);
+            formData.append('audio', audioData, 'recording.wav');
             formData.append('language', 'en-US');
             
             const response = await fetch(`${API_BASE_URL}/api/clinical/transcribe`, {
@@ -303,7 +304,7 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
     e.preventDefault();
     
     const text = document.getElementById('clinical-text').value;
-    const audioData = audioChunks.length > 0 && currentRecordingType === 'clinical' ? await getAudioBase64() : null;
+    const audioData = audioChunks.length > 0 && currentRecordingType === 'clinical' ? await getAudioBlob() : null;
     
     if (!text && !audioData) {
         showNotification('Please enter text or record audio.', 'error');
@@ -326,7 +327,7 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
         
         const formData = new FormData();
         if (audioData) {
-            formData.append('audio_data', audioData);
+            formData.append('audio', audioData, 'recording.wav');
             formData.append('language', 'en-US');
         } else {
             formData.append('text', text);
@@ -336,6 +337,7 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
         if (gender) {
             formData.append('gender', gender);
         }
+        formData.append('stream', 'true');
         
         const endpoint = audioData 
             ? `${API_BASE_URL}/api/clinical/transcribe`
@@ -343,6 +345,7 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
         
         const response = await fetch(endpoint, {
             method: 'POST',
+            headers: { 'Accept': 'text/event-stream' },
             body: formData
         });
         
@@ -351,7 +354,7 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
             throw new Error(error.detail || 'Failed to process clinical note');
         }
         
-        const result = await response.json();
+        const result = await readSOAPStream(response);
         displayClinicalResults(result);
         showNotification('SOAP note generated successfully!', 'success');
         
@@ -365,7 +368,63 @@ document.getElementById('clinical-form').addEventListener('submit', async (e) =>
     }
 });
 
+async function readSOAPStream(response) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const emptySOAP = { subjective: "", objective: "", assessment: "", plan: "" };
+    let buffer = '';
+    let soapText = '';
+    let transcription = '';
+    let result = null;
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+            let eventType = 'message';
+            let payload = '';
+            for (const line of event.split('\n')) {
+                if (line.startsWith('event: ')) {
+                    eventType = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    payload += line.slice(6);
+                }
+            }
+            if (!payload) continue;
+            const data = JSON.parse(payload);
+            if (eventType === 'error') {
+                throw new Error(data.detail || 'SOAP note generation failed');
+            }
+            if (data.type === 'transcription') {
+                transcription = data.transcription;
+                showLoading(false);
+            } else if (data.type === 'soap_delta') {
+                soapText += data.delta;
+                renderClinicalResult({ transcription, soap_note: parseStreamedSOAP(soapText, emptySOAP) });
+            } else if (data.type === 'final') {
+                result = data;
+            }
+        }
+    }
+    
+    if (!result) {
+        throw new Error('SOAP stream ended before the note was complete');
+    }
+    return result;
+}
+
 function displayClinicalResults(result) {
+    renderClinicalResult(result);
+    
+    loadRecommendedDoctors(result.soap_note.assessment, result.transcription).catch(err => {
+        console.error('Doctors loading failed (non-blocking):', err);
+    });
+}
+
+function renderClinicalResult(result) {
     const resultsDiv = document.getElementById('clinical-results');
     
     const html = `
@@ -400,10 +459,6 @@ function displayClinicalResults(result) {
     `;
     
     resultsDiv.innerHTML = html;
-    
-    loadRecommendedDoctors(result.soap_note.assessment, result.transcription).catch(err => {
-        console.error('Doctors loading failed (non-blocking):', err);
-    });
 }
 
 async function loadRecommendedDoctors(assessment, transcription) {
@@ -568,6 +623,7 @@ async function startRecording(type) {
 async function startClinicalStreaming() {
     try {
         clinicalTranscript = "";
+        soapStreamText = "";
         clinicalSOAP = {
             subjective: "",
             objective: "No objective findings documented.",
@@ -614,6 +670,9 @@ async function startClinicalStreaming() {
             } else if (data.type === "soap_update") {
                 clinicalSOAP = data.soap;
                 updateLiveSOAP(data.soap, data.changed_sections || []);
+            } else if (data.type === "soap_delta") {
+                soapStreamText += data.delta;
+                updateLiveSOAP(parseStreamedSOAP(soapStreamText));
             } else if (data.type === "final") {
                 displayClinicalResults({
                     transcription: data.transcription,
@@ -819,6 +878,15 @@ function updateLiveTranscription(text, isInterim = false) {
     }
 }
 
+function parseStreamedSOAP(text, base = clinicalSOAP) {
+    const soap = { ...base };
+    const parts = text.split(/===(SUBJECTIVE|OBJECTIVE|ASSESSMENT|PLAN)===/i);
+    for (let i = 1; i < parts.length; i += 2) {
+        soap[parts[i].toLowerCase()] = parts[i + 1].trim();
+    }
+    return soap;
+}
+
 function updateLiveSOAP(soap, changedSections = []) {
     const updateSection = (sectionId, content, defaultContent = '-', statusId = null) => {
         const elem = document.getElementById(sectionId);
@@ -876,32 +944,17 @@ function stopRecording() {
     }
 }
 
-async function getAudioBase64() {
+async function getAudioBlob() {
     if (audioChunks.length === 0) return null;
     
     const mimeType = mediaRecorder ? mediaRecorder.mimeType : 'audio/webm';
     const audioBlob = new Blob(audioChunks, { type: mimeType });
     
     try {
-        const wavBlob = await convertToWav(audioBlob);
-        return new Promise((resolve) => {
-            const reader = new FileReader();
-            reader.onloadend = () => {
-                const base64 = reader.result.split(',')[1];
-                resolve(base64);
-            };
-            reader.readAsDataURL(wavBlob);
-        });
+        return await convertToWav(audioBlob);
     } catch (error) {
         console.error('Error converting audio:', error);
-        return new Promise((resolve) => {
-            const reader = new FileReader();
-            reader.onloadend = () => {
-                const base64 = reader.result.split(',')[1];
-                resolve(base64);
-            };
-            reader.readAsDataURL(audioBlob);
-        });
+        return audioBlob;
     }
 }
 